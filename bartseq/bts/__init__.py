@@ -0,0 +1,334 @@
+"""
+Compact binary format for tagged reads (“.bts”)
+
+A file starts with ``MAGIC``, the length of a JSON header and the header itself.
+The header contains the barcode IDs and the primer length.
+Blocks of records follow, each prefixed by its compressed size and number of records.
+They are compressed independently, so a :class:`~bartseq.index.ReadIndex` can point to them.
+
+A block is stored column-wise: barcode numbers, flags, other barcodes, headers,
+2-bit packed junk/linker/amplicon sequences (non-ACGT bases are stored as exceptions) and qualities.
+The qualities are the ones that would be written to FASTQ, optionally with Illumina’s 8-level binning.
+"""
+import json
+import struct
+import zlib
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple, List, Sequence, Union, BinaryIO, TextIO, Generator, Iterator
+
+import numpy as np
+
+from ..io import compressors
+from ..read_tagger import TaggedRead, format_fastq
+
+
+MAGIC = b'BTS\x01'
+SUFFIX = '.bts'
+
+FLAG_BARCODE_MISMATCH = 1
+FLAG_JUNK = 2
+FLAG_LINKER = 4
+
+SEQ_FIELDS = ['junk', 'linker', 'amplicon']
+
+BLOCK_HEAD = struct.Struct('<II')  # compressed size, number of records
+SECTION_HEAD = struct.Struct('<I')
+
+# 2-bit codes for bases, 255 for everything else
+CODES = np.full(256, 255, np.uint8)
+CODES[np.frombuffer(b'ACGT', np.uint8)] = np.arange(4)
+BASES = np.frombuffer(b'ACGT', np.uint8)
+
+# Illumina’s 8-level quality binning: Phred scores below each limit get that bin’s score
+QUAL_BIN_LIMITS = [(10, 6), (20, 15), (25, 22), (30, 27), (35, 33), (40, 37), (256, 40)]
+# The same as a translation table for Phred+33 quality strings
+QUAL_BINS = bytes(
+	c if q < 2 else 33 + next(b for lim, b in QUAL_BIN_LIMITS if q < lim)
+	for c, q in ((c, c - 33) for c in range(256))
+)
+
+
+class BtsRead(NamedTuple):
+	"""A tagged read as read back from a .bts file. ``qual`` is already cut to the amplicon."""
+	header: str
+	qual: str
+	len_primer: int
+	junk: Optional[str]
+	barcode: Optional[str]
+	linker: Optional[str]
+	amplicon: str
+	other_barcodes: Tuple[str, ...]
+	barcode_mismatch: bool
+	
+	has_multiple_barcodes = TaggedRead.has_multiple_barcodes
+	is_just_primer = TaggedRead.is_just_primer
+	is_regular = TaggedRead.is_regular
+	
+	def fastq_parts(self) -> Tuple[str, str, str]:
+		"""Header, sequence and quality as :func:`bartseq.io.iter_fq` would parse them from the FASTQ output"""
+		header, seq, _, qual, _ = str(self).split('\n')
+		return header, seq, qual
+	
+	def __str__(self):
+		return format_fastq(self, self.qual)
+
+
+def padded_positions(lengths: np.ndarray) -> np.ndarray:
+	"""Positions of the characters if every sequence is padded to a multiple of 4.
+	Identical sequences then pack to identical bytes, which zlib can find repeats in."""
+	lengths = lengths.astype(np.int64)
+	padded = (lengths + 3) // 4 * 4
+	shift = np.cumsum(padded) - padded - (np.cumsum(lengths) - lengths)
+	return np.repeat(shift, lengths) + np.arange(lengths.sum())
+
+
+def pack_seqs(seqs: Sequence[str]) -> List[bytes]:
+	"""Pack sequences into lengths, 2-bit codes, positions and values of non-ACGT characters"""
+	lengths = np.fromiter(map(len, seqs), np.uint32, len(seqs))
+	chars = np.frombuffer(''.join(seqs).encode('ascii'), np.uint8)
+	codes = CODES[chars]
+	exc_pos = np.flatnonzero(codes == 255).astype(np.uint32)
+	codes[exc_pos] = 0
+	padded = np.zeros(int(((lengths + 3) // 4).sum()) * 4, np.uint8)
+	padded[padded_positions(lengths)] = codes
+	padded = padded.reshape(-1, 4)
+	packed = padded[:, 0] << 6 | padded[:, 1] << 4 | padded[:, 2] << 2 | padded[:, 3]
+	return [lengths.tobytes(), packed.tobytes(), exc_pos.tobytes(), chars[exc_pos].tobytes()]
+
+
+def unpack_seqs(lengths: bytes, packed: bytes, exc_pos: bytes, exc_chars: bytes) -> List[str]:
+	lengths = np.frombuffer(lengths, np.uint32)
+	packed = np.frombuffer(packed, np.uint8)
+	codes = np.stack([packed >> 6, packed >> 4 & 3, packed >> 2 & 3, packed & 3], axis=1).ravel()
+	chars = BASES[codes[padded_positions(lengths)]]
+	chars[np.frombuffer(exc_pos, np.uint32)] = np.frombuffer(exc_chars, np.uint8)
+	return split_lengths(chars.tobytes().decode('ascii'), lengths)
+
+
+def split_lengths(data: str, lengths: np.ndarray) -> List[str]:
+	ends = np.cumsum(lengths).tolist()
+	return [data[start:end] for start, end in zip([0] + ends, ends)]
+
+
+class BtsWriter:
+	"""
+	Writes tagged reads to a .bts file.
+	
+	Has the same interface as :class:`~bartseq.io.BlockWriter`, so it can be used by :class:`~bartseq.index.ReadIndexer`.
+	"""
+	def __init__(
+		self,
+		file: Union[Path, str, BinaryIO, TextIO],
+		barcode_ids: Sequence[str],
+		*,
+		len_primer: int,
+		block_size: Optional[int] = None,
+		bin_qual: bool = False,
+		level: int = 6,
+		ensure_parentdir: bool = False,
+	):
+		"""
+		:param file: Path or binary (or text with ``buffer``) file to write to
+		:param barcode_ids: All barcode IDs that can occur in reads
+		:param len_primer: Primer length, needed to determine if reads are just primer
+		:param block_size: Write a block every ``block_size`` reads. If ``None``, only :meth:`flush_block` does it
+		:param bin_qual: Bin quality scores into 8 levels (lossy, but compresses much better)
+		:param level: zlib compression level
+		"""
+		if isinstance(file, (str, Path)):
+			if ensure_parentdir:
+				Path(file).parent.mkdir(parents=True, exist_ok=True)
+			self.file = open(file, 'wb')
+			self.owns_file = True
+		else:
+			self.file = getattr(file, 'buffer', file)
+			self.owns_file = False
+		if len(barcode_ids) >= 2**16:
+			raise ValueError(f'Cannot store more than {2**16 - 1} barcodes')
+		self.bc_numbers = {bc_id: i for i, bc_id in enumerate(barcode_ids, 1)}
+		self.block_size = block_size
+		self.bin_qual = bin_qual
+		self.level = level
+		self.reads: List[TaggedRead] = []
+		
+		header = json.dumps(dict(barcodes=list(barcode_ids), len_primer=len_primer, binned_qual=bin_qual)).encode()
+		self.file.write(MAGIC + SECTION_HEAD.pack(len(header)) + header)
+		self.offset = len(MAGIC) + SECTION_HEAD.size + len(header)
+	
+	def write(self, read: TaggedRead):
+		self.reads.append(read)
+		if self.block_size is not None and len(self.reads) >= self.block_size:
+			self.flush_block()
+	
+	def encode_block(self, reads: Sequence[TaggedRead]) -> List[bytes]:
+		bc_numbers = self.bc_numbers
+		others = [bc_numbers[bc] for read in reads for bc in read.other_barcodes]
+		quals = ''.join(read.cut_seq(read.qual) for read in reads).encode('ascii')
+		sections = [
+			np.array([bc_numbers.get(read.barcode, 0) for read in reads], np.uint16).tobytes(),
+			np.array([
+				FLAG_BARCODE_MISMATCH * read.barcode_mismatch |
+				FLAG_JUNK * (read.junk is not None) |
+				FLAG_LINKER * (read.linker is not None)
+				for read in reads
+			], np.uint8).tobytes(),
+			np.array([len(read.other_barcodes) for read in reads], np.uint8).tobytes(),
+			np.array(others, np.uint16).tobytes(),
+			np.array([len(read.header) for read in reads], np.uint32).tobytes(),
+			''.join(read.header for read in reads).encode('ascii'),
+		]
+		for field in SEQ_FIELDS:
+			sections += pack_seqs([getattr(read, field) or '' for read in reads])
+		sections += [
+			np.array([len(read.cut_seq(read.qual)) for read in reads], np.uint32).tobytes(),
+			quals.translate(QUAL_BINS) if self.bin_qual else quals,
+		]
+		return sections
+	
+	def flush_block(self) -> int:
+		"""Compress and write the current block and return the offset it starts at"""
+		start = self.offset
+		if self.reads:
+			sections = self.encode_block(self.reads)
+			data = zlib.compress(b''.join(SECTION_HEAD.pack(len(s)) + s for s in sections), self.level)
+			self.file.write(BLOCK_HEAD.pack(len(data), len(self.reads)) + data)
+			self.offset += BLOCK_HEAD.size + len(data)
+			self.reads.clear()
+		return start
+	
+	def close(self):
+		self.flush_block()
+		if self.owns_file:
+			self.file.close()
+		else:
+			self.file.flush()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *exc):
+		self.close()
+
+
+def read_exactly(file: BinaryIO, size: int) -> bytes:
+	data = file.read(size)
+	if len(data) != size:
+		raise IOError(f'Truncated .bts file: Expected {size} bytes, got {len(data)}')
+	return data
+
+
+def split_sections(payload: bytes) -> Iterator[bytes]:
+	view = memoryview(payload)
+	pos = 0
+	while pos < len(view):
+		size, = SECTION_HEAD.unpack_from(view, pos)
+		pos += SECTION_HEAD.size
+		yield view[pos:pos + size]
+		pos += size
+
+
+class BtsReader:
+	"""Reads a .bts file sequentially, or block-wise starting at offsets from a :class:`~bartseq.index.ReadIndex`"""
+	def __init__(self, file: Union[Path, str, BinaryIO, TextIO]):
+		if isinstance(file, (str, Path)):
+			self.file = open(file, 'rb')
+			self.owns_file = True
+		else:
+			self.file = getattr(file, 'buffer', file)
+			self.owns_file = False
+		if read_exactly(self.file, len(MAGIC)) != MAGIC:
+			raise IOError(f'Not a .bts file: {file}')
+		size, = SECTION_HEAD.unpack(read_exactly(self.file, SECTION_HEAD.size))
+		header = json.loads(read_exactly(self.file, size))
+		self.barcodes: List[Optional[str]] = [None] + header['barcodes']
+		self.len_primer: int = header['len_primer']
+		self.binned_qual: bool = header['binned_qual']
+	
+	def seek(self, offset: int):
+		self.file.seek(offset)
+	
+	def iter_compressed_blocks(self) -> Generator[Tuple[int, bytes], None, None]:
+		while True:
+			head = self.file.read(BLOCK_HEAD.size)
+			if not head:
+				return
+			if len(head) != BLOCK_HEAD.size:
+				raise IOError('Truncated .bts file')
+			size, n_records = BLOCK_HEAD.unpack(head)
+			yield n_records, read_exactly(self.file, size)
+	
+	def iter_blocks(self) -> Generator[Tuple[int, List[memoryview]], None, None]:
+		"""Yields number of records and decompressed sections of each block"""
+		for n_records, data in self.iter_compressed_blocks():
+			yield n_records, list(split_sections(zlib.decompress(data)))
+	
+	def iter_barcodes(self) -> Generator[Tuple[Optional[str], bool], None, None]:
+		"""Yields only barcode IDs and barcode mismatch flags, decompressing only the start of each block"""
+		for n_records, data in self.iter_compressed_blocks():
+			# The first two sections are the barcode numbers (uint16) and flags (uint8)
+			prefix = zlib.decompressobj().decompress(data, 2 * SECTION_HEAD.size + 3 * n_records)
+			sections = list(split_sections(prefix))
+			numbers = np.frombuffer(sections[0], np.uint16).tolist()
+			flags = np.frombuffer(sections[1], np.uint8).tolist()
+			for number, flag in zip(numbers, flags):
+				yield self.barcodes[number], bool(flag & FLAG_BARCODE_MISMATCH)
+	
+	def decode_block(self, n_records: int, sections: List[memoryview]) -> List[BtsRead]:
+		numbers = np.frombuffer(sections[0], np.uint16).tolist()
+		flags = np.frombuffer(sections[1], np.uint8).tolist()
+		n_others = np.frombuffer(sections[2], np.uint8)
+		others = iter([self.barcodes[n] for n in np.frombuffer(sections[3], np.uint16).tolist()])
+		headers = split_lengths(bytes(sections[5]).decode('ascii'), np.frombuffer(sections[4], np.uint32))
+		junks, linkers, amplicons = (unpack_seqs(*sections[6 + 4*i:10 + 4*i]) for i in range(len(SEQ_FIELDS)))
+		quals = split_lengths(bytes(sections[19]).decode('ascii'), np.frombuffer(sections[18], np.uint32))
+		return [
+			BtsRead(
+				header, qual, self.len_primer,
+				junk if flag & FLAG_JUNK else None,
+				self.barcodes[number],
+				linker if flag & FLAG_LINKER else None,
+				amplicon,
+				tuple(next(others) for _ in range(n_other)),
+				bool(flag & FLAG_BARCODE_MISMATCH),
+			)
+			for header, qual, junk, number, linker, amplicon, n_other, flag
+			in zip(headers, quals, junks, numbers, linkers, amplicons, n_others.tolist(), flags)
+		]
+	
+	def __iter__(self) -> Generator[BtsRead, None, None]:
+		for n_records, sections in self.iter_blocks():
+			yield from self.decode_block(n_records, sections)
+	
+	def close(self):
+		if self.owns_file:
+			self.file.close()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *exc):
+		self.close()
+
+
+def iter_bts_fq(path: Union[Path, str], offset: Optional[int] = None) -> Generator[Tuple[str, str, str], None, None]:
+	"""Like :func:`bartseq.io.iter_fq` on the FASTQ version of a .bts file, optionally starting at a block offset"""
+	with BtsReader(path) as reader:
+		if offset is not None:
+			reader.seek(offset)
+		for read in reader:
+			yield read.fastq_parts()
+
+
+def is_bts(file: Union[Path, str, BinaryIO, TextIO], compression: Optional[str] = None) -> bool:
+	if compression is not None:
+		return compression == SUFFIX[1:]
+	return isinstance(file, (str, Path)) and Path(file).suffix == SUFFIX
+
+
+def tagged_read_paths(dir_tagged: Path, library: str) -> List[Path]:
+	"""Paths of the tagged reads of a library, preferring .bts files, then FASTQ in any supported compression"""
+	for suffix in [SUFFIX, *(f'.fastq.{compression}' for compression in compressors)]:
+		paths = [dir_tagged / f'{library}_R{r}{suffix}' for r in [1, 2]]
+		if all(path.is_file() for path in paths):
+			return paths
+	return [dir_tagged / f'{library}_R{r}.fastq.gz' for r in [1, 2]]
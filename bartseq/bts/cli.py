@@ -0,0 +1,30 @@
+from argparse import ArgumentParser, Namespace
+
+from .main import to_fastq
+from ..io import openers
+from ..cli_helpers import CLI, t_in_file, t_out_file, clean_kbdinterrupt
+
+
+class BtsToFastqCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'in_file', nargs='?', default='-', type=t_in_file,
+			help='.bts file or (compressed) FASTQ file to read from')
+		parser.add_argument(
+			'out', nargs='?', default='-', type=t_out_file,
+			help='FASTQ file to write to. Supported compression: see --out-compression')
+		parser.add_argument(
+			'--out-compression', '-o', choices=openers.keys(),
+			help='Specify compression if writing to stdout or a file with unusual suffix')
+		return parser
+	
+	@staticmethod
+	@clean_kbdinterrupt
+	def run(parser: ArgumentParser, args: Namespace):
+		kwargs = vars(args)
+		del kwargs['func']
+		to_fastq(**kwargs)
+
+
+cli = BtsToFastqCLI()
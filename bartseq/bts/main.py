@@ -0,0 +1,26 @@
+import shutil
+from pathlib import Path
+from typing import Union, Optional, TextIO, BinaryIO
+
+from . import BtsReader, is_bts
+from ..io import transparent_open
+
+
+def to_fastq(
+	in_file: Union[Path, str, BinaryIO, TextIO],
+	out: Union[Path, str, TextIO],
+	out_compression: Optional[str] = None,
+):
+	"""
+	Convert a .bts file to the FASTQ the tagger would have written, e.g. to pipe it into an aligner.
+	Compressed FASTQ files are just decompressed, so aligners can read every format the tagger can write.
+	"""
+	if not is_bts(in_file):
+		with transparent_open(in_file, 'rb') as f_in, \
+				transparent_open(getattr(out, 'buffer', out), 'wb', suffix=out_compression, ensure_parentdir=True) as f_out:
+			shutil.copyfileobj(f_in, f_out, 2**20)
+		return
+	with BtsReader(in_file) as reader, \
+			transparent_open(out, 'wt', suffix=out_compression, ensure_parentdir=True) as f_out:
+		for n_records, sections in reader.iter_blocks():
+			f_out.write(''.join(map(str, reader.decode_block(n_records, sections))))
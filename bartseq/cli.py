@@ -4,12 +4,24 @@ from .cli_helpers import CLI, DelegatingCLI
 from .read_tagger.cli import ReadTaggerCLI
 from .fastq_browser.cli import FastqBrowserCLI
 from .counter.cli import CounterCLI
+from .xlsx_export.cli import XlsxExportCLI
+from .bts.cli import BtsToFastqCLI
+from .manifest.cli import ManifestCLI
+from .scatter.cli import SplitCLI, MergeStatsCLI, MergeCountsCLI
+from .estimate.cli import EstimateCLI
 
 
 SUBCMDS: Dict[str, CLI] = {
 	'tag': ReadTaggerCLI(),
 	'browse': FastqBrowserCLI(),
 	'count': CounterCLI(),
+	'export-xlsx': XlsxExportCLI(),
+	'to-fastq': BtsToFastqCLI(),
+	'manifest': ManifestCLI(),
+	'split': SplitCLI(),
+	'merge-stats': MergeStatsCLI(),
+	'merge-counts': MergeCountsCLI(),
+	'estimate': EstimateCLI(),
 }
 
 
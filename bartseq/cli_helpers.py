@@ -91,6 +91,7 @@ def clean_kbdinterrupt(callback):
 
 
 RE_READ_FILE = re.compile(r'(?P<lib>.+)_R(?P<read>[12])_001\.fastq\.gz')
+RE_SHARD = re.compile(r'(?P<lib>.+)\.part\d+')
 
 
 def suggest_library(data_dir: Path, library: Optional[str], raise_error: Callable[[str], None]) -> str:
@@ -98,7 +99,8 @@ def suggest_library(data_dir: Path, library: Optional[str], raise_error: Callabl
 		RE_READ_FILE.fullmatch(p.name)['lib']
 		for p in (data_dir / 'in' / 'reads').glob('*_R[12]_001.fastq.gz')
 	})
-	if library in libraries:
+	shard_match = RE_SHARD.fullmatch(library or '')
+	if library in libraries or (shard_match and shard_match['lib'] in libraries):
 		return library
 	elif len(libraries) == 1:
 		return libraries[0]
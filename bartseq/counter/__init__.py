@@ -1,14 +1,21 @@
 import json
 import re
+import time
 import collections
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Tuple, Counter, Generator, Iterator
+from typing import Optional, Tuple, Counter, Generator, Iterator, Callable
 
 from tqdm import tqdm
 
+from ..bts import BtsReader, is_bts, tagged_read_paths
 from ..io import transparent_open
+from .follow import follow_lines, summary_written
 
 
+# Amplicon names for read pairs that couldn’t be assigned to one amplicon
+PSEUDO_AMPLICONS = ['-unmapped', '-one-mapped', '-mismatch']
+
 bc_re = re.compile(r'barcode=(\w+)')
 bc_mm_re = re.compile(r'barcode-mismatch=(True|False)')
 
@@ -22,6 +29,17 @@ def get_barcodes(fastq_file: Iterator[str], allow_mismatch: bool) -> Generator[T
 		yield bc_re.search(header).group(1), mm
 
 
+@contextmanager
+def open_barcodes(path: Path, allow_mismatch: bool) -> Generator[Iterator[Tuple[str, Optional[bool]]], None, None]:
+	"""Iterate barcodes and mismatch flags (``None`` if ``allow_mismatch``) of tagged FASTQ or .bts reads"""
+	if is_bts(path):
+		with BtsReader(path) as reader:
+			yield ((bc, None if allow_mismatch else mm) for bc, mm in reader.iter_barcodes())
+	else:
+		with transparent_open(path) as f:
+			yield get_barcodes(f, allow_mismatch)
+
+
 def count(
 	data_dir: Path,
 	library: str,
@@ -29,10 +47,33 @@ def count(
 	allow_mismatch: bool = True,
 	total: Optional[int] = None,
 	amp_min: Optional[int] = None,
+	follow: bool = False,
+	mapping_done: Optional[Callable[[int], bool]] = None,
+	follow_timeout: Optional[float] = None,
+	on_snapshot: Optional[Callable[[Counter[Tuple[str, str, str]], Counter[Tuple[str, str, str]]], None]] = None,
+	snapshot_interval: float = 0.,
 ) -> Tuple[Counter[Tuple[str, str, str]], Counter[Tuple[str, str, str]]]:
-	reads = [f'{data_dir}/process/3-tagged/{library}_R{read}.fastq.gz' for read in [1, 2]]
+	"""
+	Count read pairs per barcode pair and amplicon
+	:param follow: Read the mapping files while they are still being written.
+		The tagged reads need to be complete, counting ends after the last of them
+	:param mapping_done: Called with the number of lines read from a mapping file if no new lines are available.
+		Returns true if the file is complete. Default: Check if HISAT2 wrote its summary file and all lines are read
+	:param follow_timeout: Fail if a followed mapping file doesn’t grow for this many seconds
+	:param on_snapshot: Called with the counts so far every ``snapshot_interval`` seconds
+	"""
+	reads = tagged_read_paths(Path(data_dir) / 'process' / '3-tagged', library)
 	mappings = [f'{data_dir}/process/4-mapped/{library}_R{read}.tsv' for read in [1, 2]]
 	
+	@contextmanager
+	def open_mapping(read: int) -> Generator[Iterator[str], None, None]:
+		if not follow:
+			with open(mappings[read - 1]) as f:
+				yield f
+			return
+		is_done = mapping_done or summary_written(f'{data_dir}/process/4-mapped/{library}_R{read}_summary.txt')
+		yield follow_lines(mappings[read - 1], is_done, timeout=follow_timeout)
+	
 	if total is None:
 		try:
 			total = json.loads(Path(f'{data_dir}/process/3-tagged/{library}_stats.json').read_bytes())['n_both_regular']
@@ -42,14 +83,18 @@ def count(
 	counts_both = collections.Counter()
 	counts_one = collections.Counter()
 	with \
-		transparent_open(reads[0]) as r1, open(mappings[0]) as a1, \
-		transparent_open(reads[1]) as r2, open(mappings[1]) as a2:
+		open_barcodes(reads[0], allow_mismatch) as bcs1, open_mapping(1) as a1, \
+		open_barcodes(reads[1], allow_mismatch) as bcs2, open_mapping(2) as a2:
 		
-		bcs1 = get_barcodes(r1, allow_mismatch)
-		bcs2 = get_barcodes(r2, allow_mismatch)
 		amps1 = (a.strip().split('\t') for a in a1)
 		amps2 = (a.strip().split('\t') for a in a2)
-		for (bc1, bc1mm), (bc2, bc2mm), (amp1, amp1s), (amp2, amp2s) in tqdm(zip(bcs1, bcs2, amps1, amps2), total=total):
+		last_snapshot = time.monotonic()
+		# The barcodes come first, so zip stops after the last tagged read without waiting for more mappings
+		pairs = tqdm(zip(bcs1, bcs2, amps1, amps2), total=total)
+		for r, ((bc1, bc1mm), (bc2, bc2mm), (amp1, amp1s), (amp2, amp2s)) in enumerate(pairs):
+			if on_snapshot and r % 10000 == 0 and time.monotonic() - last_snapshot >= snapshot_interval:
+				on_snapshot(counts_both, counts_one)
+				last_snapshot = time.monotonic()
 			# If we don’t allow mismatches in barcodes, we skip this read pair
 			if not allow_mismatch and bc1mm or bc2mm:
 				continue
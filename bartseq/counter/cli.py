@@ -20,10 +20,29 @@ class CounterCLI(CLI):
 			help='Ignore barcodes with mismatches while counting.')
 		parser.add_argument(
 			'--both', default=None, action='store_true',
-			help='Print the count results for both to stdout. Default: Write to “./process/5-counts” instead')
+			help=(
+				'Print the count results for both to stdout. '
+				'Default: Write to “./process/5-counts” and “./process/counts.sqlite” instead'))
 		parser.add_argument(
 			'--one', default=None, action='store_true',
-			help='Print the count results for one to stdout. Default: Write to “./process/5-counts” instead')
+			help=(
+				'Print the count results for one to stdout. '
+				'Default: Write to “./process/5-counts” and “./process/counts.sqlite” instead'))
+		parser.add_argument(
+			'--matrices', '-m', action='store_true',
+			help='Also write per-amplicon and per-library count matrices to “./out/counts”')
+		parser.add_argument(
+			'--follow', '-f', action='store_true', help=(
+				'Count while HISAT2 is still writing “./process/4-mapped”. '
+				'A mapping file is complete once its summary file is written and it has a line for every read'))
+		parser.add_argument(
+			'--follow-timeout', type=float, default=600, metavar='SECONDS',
+			help='Fail if a followed mapping file doesn’t grow for this many seconds')
+		parser.add_argument(
+			'--snapshot-interval', type=float, default=60, metavar='SECONDS',
+			help=(
+				'Seconds between count snapshots in “./process/5-counts/*/<library>.partial.tsv” with --follow. '
+				'“0” disables them'))
 		return parser
 	
 	@staticmethod
@@ -36,6 +55,8 @@ class CounterCLI(CLI):
 			args.both = not args.one
 		del args.one
 		args.library = suggest_library(args.data_dir, args.library, parser.error)
+		if not args.follow:
+			args.snapshot_interval = 0
 	
 	@staticmethod
 	@clean_kbdinterrupt
@@ -0,0 +1,72 @@
+"""Reading mapping files while HISAT2 is still writing them, so counting overlaps mapping"""
+import time
+from pathlib import Path
+from typing import Callable, Generator, Union, Optional
+
+
+def follow_lines(
+	path: Union[Path, str],
+	is_done: Callable[[int], bool],
+	*,
+	poll_interval: float = .2,
+	timeout: Optional[float] = None,
+) -> Generator[str, None, None]:
+	"""
+	Yield lines of a file that is still being written, like ``tail -f``
+	:param is_done: Called with the number of lines read so far whenever no new data is available.
+		Returns true once the writer finished. The rest of the file is read after that
+	:param poll_interval: Seconds to wait for new data
+	:param timeout: Raise a :class:`TimeoutError` if the file doesn’t grow for this many seconds
+	"""
+	path = Path(path)
+	last_growth = time.monotonic()
+	
+	def wait():
+		if timeout is not None and time.monotonic() - last_growth > timeout:
+			raise TimeoutError(f'{path} didn’t grow for {timeout}s')
+		time.sleep(poll_interval)
+	
+	while not path.exists():
+		if is_done(0):
+			raise FileNotFoundError(f'{path} wasn’t written')
+		wait()
+	
+	n_lines = 0
+	rest = ''
+	done = False
+	with path.open() as f:
+		while True:
+			chunk = f.read(2**16)
+			if chunk:
+				lines = (rest + chunk).split('\n')
+				rest = lines.pop()
+				n_lines += len(lines)
+				yield from lines
+				last_growth = time.monotonic()
+			elif done:
+				if rest:
+					yield rest
+				return
+			else:
+				# Read once more after the writer finished, it might have written since the last read
+				done = is_done(n_lines)
+				if not done:
+					wait()
+
+
+def summary_written(path_summary: Union[Path, str]) -> Callable[[int], bool]:
+	"""
+	Check if HISAT2 finished writing a mapping file:
+	It writes its summary file at the end, and the mapping file has one line per read.
+	"""
+	from ..xlsx_export.main import RE_SUMMARY
+	
+	path_summary = Path(path_summary)
+	
+	def is_done(n_lines: int) -> bool:
+		if not path_summary.is_file():
+			return False
+		match = RE_SUMMARY.match(path_summary.read_text('utf-8'))
+		return bool(match) and n_lines >= int(match['total'])
+	
+	return is_done
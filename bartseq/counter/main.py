@@ -1,9 +1,15 @@
+import os
 import sys
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from typing import Optional, Counter, Tuple
-from typing.io import TextIO
+from typing import Optional, Counter, Tuple, Sequence, TextIO, Callable
 
-from . import count
+from . import count, PSEUDO_AMPLICONS
+from .matrices import counts_to_frame, write_lib_matrices
+from .store import CountStore
+from ..io import read_fasta
+from ..scatter import is_shard
 
 
 def print_counter(counter: Counter[Tuple[str, str, str]], of: Optional[TextIO] = None):
@@ -14,6 +20,41 @@ def print_counter(counter: Counter[Tuple[str, str, str]], of: Optional[TextIO] =
 		print(*fields, c, sep='\t', file=of)
 
 
+def write_counts(
+	counter: Counter[Tuple[str, str, str]],
+	counting: str,
+	library: str,
+	store: Optional[CountStore] = None,
+	amplicons: Optional[Sequence[str]] = None,
+):
+	"""
+	Write a library’s counts to “./process/5-counts” and its matrices
+	:param store: If specified, also replace the library’s counts in this count store
+	:param amplicons: If specified, also write count matrices for these amplicons to “./out/counts”
+	"""
+	path = Path('process', '5-counts', counting, f'{library}.tsv')
+	with path.open('w') as of:
+		print_counter(counter, of)
+	if store is not None:
+		store.replace_library(library, counting, counter, source=path)
+	if amplicons is not None:
+		write_lib_matrices(counts_to_frame(counter), Path('out/counts', counting), library, amplicons)
+
+
+def partial_counts_path(counting: str, library: str) -> Path:
+	return Path('process', '5-counts', counting, f'{library}.partial.tsv')
+
+
+def write_snapshot(library: str, counts_both: Counter[Tuple[str, str, str]], counts_one: Counter[Tuple[str, str, str]]):
+	"""Write the counts so far next to the final count tables, replacing them atomically"""
+	for counter, counting in [(counts_both, 'both'), (counts_one, 'one')]:
+		path = partial_counts_path(counting, library)
+		path_tmp = path.with_name(f'.{path.name}.tmp')
+		with path_tmp.open('w') as of:
+			print_counter(counter, of)
+		os.replace(path_tmp, path)
+
+
 def main(
 	data_dir: Path,
 	library: str,
@@ -22,12 +63,40 @@ def main(
 	both: Optional[bool] = None,
 	total: Optional[int] = None,
 	amp_min: Optional[int] = None,
+	amplicons: Optional[Sequence[str]] = None,
+	matrices: bool = False,
+	follow: bool = False,
+	mapping_done: Optional[Callable[[int], bool]] = None,
+	follow_timeout: Optional[float] = None,
+	snapshot_interval: float = 0.,
 ):
-	counts_both, counts_one = count(data_dir, library, allow_mismatch=allow_mismatch, total=total, amp_min=amp_min)
+	"""
+	Count reads per barcode pair and amplicon
+	:param amplicons: If specified, also write count matrices for these amplicons to “./out/counts”
+	:param matrices: Like ``amplicons``, but read amplicon names from “./process/1-index/amplicons”
+	:param follow: Count while the mapping files are still being written, see :func:`bartseq.counter.count`
+	:param snapshot_interval: Seconds between snapshots of the counts in “./process/5-counts/*/<library>.partial.tsv”.
+		They are only written if the results are written to files. ``0`` disables them
+	"""
+	write_snapshots = both is None and snapshot_interval > 0
+	counts_both, counts_one = count(
+		data_dir, library, allow_mismatch=allow_mismatch, total=total, amp_min=amp_min,
+		follow=follow, mapping_done=mapping_done, follow_timeout=follow_timeout,
+		on_snapshot=partial(write_snapshot, library) if write_snapshots else None, snapshot_interval=snapshot_interval,
+	)
+	
+	if matrices and amplicons is None:
+		amplicons = [name for name, _ in read_fasta(data_dir / 'process' / '1-index' / 'amplicons' / f'{library}.fa')]
+		amplicons += PSEUDO_AMPLICONS
 	
 	if both is None:
-		for counter, counting in [(counts_both, 'both'), (counts_one, 'one')]:
-			with open(f'process/5-counts/{counting}/{library}.tsv', 'w') as of:
-				print_counter(counter, of)
+		with ExitStack() as stack:
+			# A shard’s counts only go into the store merged into its library’s
+			store = None if is_shard(library) else stack.enter_context(CountStore())
+			for counter, counting in [(counts_both, 'both'), (counts_one, 'one')]:
+				write_counts(counter, counting, library, store, amplicons)
+				partial_path = partial_counts_path(counting, library)
+				if write_snapshots and partial_path.is_file():
+					partial_path.unlink()
 	else:
 		print_counter(counts_both if both else counts_one)
@@ -0,0 +1,68 @@
+"""Wide barcode × barcode count matrices per amplicon, library and for all libraries"""
+from pathlib import Path
+from typing import Counter, Tuple, Sequence, Iterable, Union, List
+
+import pandas as pd
+
+
+def counts_to_frame(counter: Counter[Tuple[str, str, str]]) -> pd.DataFrame:
+	entries = [(*fields, c) for fields, c in counter.items()]
+	return pd.DataFrame(entries, columns=['bc_l', 'bc_r', 'amp', 'count'])
+
+
+def read_counts(paths: Iterable[Union[Path, str]]) -> pd.DataFrame:
+	"""Read and concatenate count tables as written by the counter"""
+	return pd.concat([pd.read_csv(path, sep='\t', dtype=dict(amp=str)) for path in paths], ignore_index=True)
+
+
+def read_matrix(path: Union[Path, str]) -> pd.DataFrame:
+	return pd.read_csv(path, sep='\t', index_col='bc_l')
+
+
+def to_matrix(entries: pd.DataFrame) -> pd.DataFrame:
+	"""Sum up counts for each barcode pair into a wide bc_l × bc_r table"""
+	if entries.empty:
+		return pd.DataFrame(index=pd.Index([], name='bc_l'), columns=pd.Index([], name='bc_r'))
+	return entries.groupby(['bc_l', 'bc_r'])['count'].sum().unstack('bc_r')
+
+
+def only_lr(table: pd.DataFrame) -> pd.DataFrame:
+	"""Only keep left barcodes as rows and right barcodes as columns"""
+	if table.shape == (0, 0):  # here, the empty index can’t use str methods
+		return table
+	return table.loc[table.index.str.match('L.*'), table.columns.str.match('R.*')]
+
+
+def write_matrix(table: pd.DataFrame, path_all: Path) -> List[Path]:
+	"""Write ``…-all.tsv`` and the L×R only ``….tsv`` next to it"""
+	path_lr = path_all.with_name(path_all.name.replace('-all.tsv', '.tsv'))
+	path_all.parent.mkdir(parents=True, exist_ok=True)
+	table.to_csv(path_all, sep='\t')
+	only_lr(table).to_csv(path_lr, sep='\t')
+	return [path_all, path_lr]
+
+
+def lib_matrix_paths(dir_counting: Path, library: str, amplicons: Sequence[str]) -> List[Path]:
+	paths = []
+	for name in [f'{amp}/{library}-{amp}' for amp in amplicons] + [library]:
+		paths += [dir_counting / library / f'{name}-all.tsv', dir_counting / library / f'{name}.tsv']
+	return paths
+
+
+def write_lib_matrices(entries: pd.DataFrame, dir_counting: Path, library: str, amplicons: Sequence[str]) -> List[Path]:
+	"""
+	Write per-amplicon and per-library matrices in one pass over the counts
+	:param entries: Long count table with the columns bc_l, bc_r, amp, count
+	:param dir_counting: Directory to write to, e.g. ``out/counts/both``
+	:param library: Library name
+	:param amplicons: Amplicons to write matrices for (the library matrix is the sum over them)
+	:return: Paths of the written files
+	"""
+	entries = entries[entries.amp.isin(amplicons)]
+	by_amp = dict(list(entries.groupby('amp')))
+	paths = []
+	for amp in amplicons:
+		table = to_matrix(by_amp.get(amp, entries.iloc[:0]))
+		paths += write_matrix(table, dir_counting / library / amp / f'{library}-{amp}-all.tsv')
+	paths += write_matrix(to_matrix(entries), dir_counting / library / f'{library}-all.tsv')
+	return paths
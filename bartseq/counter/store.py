@@ -0,0 +1,184 @@
+"""
+Persistent sparse count store: The counts of all libraries in one SQLite database, replaced one library at a time.
+Running totals over all libraries are kept up to date with each replacement,
+so adding or re-counting a library only costs time proportional to that library.
+The store remembers which version of each library’s count table it holds, so changed tables are re-read.
+"""
+import collections
+import sqlite3
+from pathlib import Path
+from typing import Counter, Tuple, Union, List, Iterable, Generator, Dict, Optional
+
+import pandas as pd
+
+from ..manifest import get_stamp
+
+
+STORE_PATH = Path('process') / 'counts.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS counts (
+	counting TEXT NOT NULL,
+	library TEXT NOT NULL,
+	bc_l TEXT NOT NULL,
+	bc_r TEXT NOT NULL,
+	amp TEXT NOT NULL,
+	count INTEGER NOT NULL,
+	PRIMARY KEY (counting, library, bc_l, bc_r, amp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS totals (
+	counting TEXT NOT NULL,
+	bc_l TEXT NOT NULL,
+	bc_r TEXT NOT NULL,
+	count INTEGER NOT NULL,
+	PRIMARY KEY (counting, bc_l, bc_r)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+	counting TEXT NOT NULL,
+	library TEXT NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	size INTEGER NOT NULL,
+	PRIMARY KEY (counting, library)
+) WITHOUT ROWID;
+'''
+
+SQL_ADD_TOTALS = '''
+INSERT INTO totals (counting, bc_l, bc_r, count)
+SELECT counting, bc_l, bc_r, {sign} SUM(count) FROM counts WHERE counting = ? AND library = ? GROUP BY bc_l, bc_r
+ON CONFLICT (counting, bc_l, bc_r) DO UPDATE SET count = count + excluded.count
+'''
+
+
+def read_count_table(path_counts: Union[Path, str]) -> Generator[Tuple[str, str, str, int], None, None]:
+	"""Entries of a count table as written by the counter"""
+	with open(path_counts) as f:
+		next(f)  # header
+		for line in f:
+			bc_l, bc_r, amp, count = line.rstrip('\n').split('\t')
+			yield bc_l, bc_r, amp, int(count)
+
+
+class CountStore:
+	"""
+	Counts per counting (both/one), library, barcode pair and amplicon.
+	Each replacement is one transaction, but SQLite’s locking is unreliable on network file systems,
+	so processes may only write to the same store concurrently if it is on a local file system.
+	The pipeline therefore writes it from a single job.
+	"""
+	def __init__(self, path: Union[Path, str] = STORE_PATH, *, timeout: float = 600., readonly: bool = False):
+		"""
+		:param path: Database file. Created if it doesn’t exist, unless ``readonly``
+		:param timeout: Seconds to wait for other processes writing to the store
+		:param readonly: Only read from an existing store
+		"""
+		self.path = Path(path)
+		if readonly:
+			uri = f'{self.path.resolve().as_uri()}?mode=ro'
+			self.db = sqlite3.connect(uri, timeout=timeout, isolation_level=None, uri=True)
+		else:
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			self.db = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None)
+			self.db.executescript(SCHEMA)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *exc_info):
+		self.close()
+	
+	def close(self):
+		self.db.close()
+	
+	def _remove(self, library: str, counting: str):
+		self.db.execute(SQL_ADD_TOTALS.format(sign='-'), (counting, library))
+		self.db.execute('DELETE FROM counts WHERE counting = ? AND library = ?', (counting, library))
+		self.db.execute('DELETE FROM sources WHERE counting = ? AND library = ?', (counting, library))
+	
+	def _transaction(self, *steps):
+		self.db.execute('BEGIN IMMEDIATE')
+		try:
+			for step, *args in steps:
+				step(*args)
+			self.db.execute('DELETE FROM totals WHERE count = 0')
+		except BaseException:
+			self.db.execute('ROLLBACK')
+			raise
+		self.db.execute('COMMIT')
+	
+	def replace_library(
+		self,
+		library: str,
+		counting: str,
+		counter: Counter[Tuple[str, str, str]],
+		*,
+		source: Optional[Union[Path, str]] = None,
+	):
+		"""
+		Replace a library’s counts, updating the totals by the difference
+		:param source: The count table with the same counts, see :meth:`sync`
+		"""
+		stamp = source and get_stamp(Path(source))
+		
+		def insert():
+			self.db.executemany(
+				'INSERT INTO counts VALUES (?, ?, ?, ?, ?, ?)',
+				((counting, library, *fields, c) for fields, c in counter.items()),
+			)
+			self.db.execute(SQL_ADD_TOTALS.format(sign=''), (counting, library))
+			if stamp:
+				self.db.execute('INSERT INTO sources VALUES (?, ?, ?, ?)', (counting, library, *stamp))
+		
+		self._transaction((self._remove, library, counting), (insert,))
+	
+	def source_stamps(self, counting: str) -> Dict[str, Tuple[int, int]]:
+		"""Modification time and size of the count table each library’s counts were read from or written to"""
+		rows = self.db.execute('SELECT library, mtime_ns, size FROM sources WHERE counting = ?', (counting,))
+		return {library: (mtime_ns, size) for library, mtime_ns, size in rows}
+	
+	def retain_libraries(self, libraries: Iterable[str], counting: str) -> List[str]:
+		"""Remove libraries that aren’t in ``libraries`` (e.g. because their input files were deleted)"""
+		obsolete = sorted((set(self.libraries(counting)) | set(self.source_stamps(counting))) - set(libraries))
+		if obsolete:
+			self._transaction(*((self._remove, library, counting) for library in obsolete))
+		return obsolete
+	
+	def libraries(self, counting: str) -> List[str]:
+		rows = self.db.execute('SELECT DISTINCT library FROM counts WHERE counting = ? ORDER BY library', (counting,))
+		return [library for library, in rows]
+	
+	def iter_library(
+		self, library: str, counting: str, *, only_lr: bool = False,
+	) -> Generator[Tuple[str, str, str, int], None, None]:
+		"""
+		Count entries of a library, sorted by barcode pair and amplicon
+		:param only_lr: Only yield entries with a left and a right barcode
+		"""
+		where_lr = " AND bc_l GLOB 'L*' AND bc_r GLOB 'R*'" if only_lr else ''
+		yield from self.db.execute(
+			f'SELECT bc_l, bc_r, amp, count FROM counts WHERE counting = ? AND library = ?{where_lr} ORDER BY bc_l, bc_r, amp',
+			(counting, library),
+		)
+	
+	def library_counts(self, library: str, counting: str) -> pd.DataFrame:
+		"""Long count table of a library with the columns bc_l, bc_r, amp, count"""
+		return pd.DataFrame(list(self.iter_library(library, counting)), columns=['bc_l', 'bc_r', 'amp', 'count'])
+	
+	def totals(self, counting: str) -> pd.DataFrame:
+		"""Long count table summed over all libraries and amplicons, with the columns bc_l, bc_r, count"""
+		rows = self.db.execute('SELECT bc_l, bc_r, count FROM totals WHERE counting = ?', (counting,))
+		return pd.DataFrame(list(rows), columns=['bc_l', 'bc_r', 'count'])
+	
+	def sync(self, paths_counts: Dict[str, Union[Path, str]], counting: str):
+		"""
+		Make the store contain exactly the given libraries with the counts in their count tables.
+		Libraries whose count table changed since the store got its counts
+		(e.g. counted before it existed, or a table was restored) are re-read from their count tables.
+		:param paths_counts: Count table as written by the counter for each library
+		"""
+		self.retain_libraries(paths_counts, counting)
+		stamps = self.source_stamps(counting)
+		for library, path in sorted(paths_counts.items()):
+			if stamps.get(library) == get_stamp(Path(path)):
+				continue
+			counter = collections.Counter({(bc_l, bc_r, amp): c for bc_l, bc_r, amp, c in read_count_table(path)})
+			self.replace_library(library, counting, counter, source=path)
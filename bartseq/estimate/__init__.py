@@ -0,0 +1,243 @@
+"""
+Rough runtime, memory and disk estimates for the pipeline’s rules, so a cluster scheduler can pack jobs.
+
+The number of reads and the barcode rate of a library are extrapolated
+from its input sizes and a sample of its first reads.
+The tagging speed is measured on that sample, the speed of the external tools is a conservative guess.
+The measurements are cached in ``process/estimates.json`` and redone when an input changes.
+"""
+import io
+import json
+import math
+import time
+from pathlib import Path
+from typing import NamedTuple, List, Tuple, Dict, Union, Optional, Sequence
+
+from ..io import openers, iter_fq, write_json_atomic
+from ..manifest import get_stamp, get_input_seq_paths
+from ..read_tagger import get_tagger
+from ..read_tagger.main import read_barcodes
+
+
+ESTIMATES_PATH = Path('process', 'estimates.json')
+
+# Read pairs per second and thread of the external tools and the counter
+THROUGHPUT = dict(
+	trim_quality=100_000,
+	split_reads=200_000,
+	map_reads=50_000,
+	count_library=150_000,
+)
+# Size of compressed FASTQ relative to gzip
+COMPRESSED_SIZE = dict(gz=1., zst=.9, xz=.8, bz2=.85, lz4=1.6, bts=.6)
+SECONDS_PER_HEATMAP = .5
+
+
+class FastqSample(NamedTuple):
+	records: List[Tuple[str, str, str]]  # The first complete records
+	ratio: float  # Uncompressed / compressed size
+	bytes_per_record: float  # Mean uncompressed size of a record
+
+
+class LibraryStats(NamedTuple):
+	n_reads: int  # Number of reads (pairs), extrapolated from the input size
+	size_in: int  # Compressed size of the input files in bytes
+	ratio: float  # Uncompressed / compressed size of the input files
+	len_read: float  # Mean read length
+	rate_regular: float  # Fraction of reads (pairs) with barcodes on both reads
+	tag_rate: float  # Tagged reads (pairs) per second
+
+
+class Resources(NamedTuple):
+	threads: int
+	mem_mb: int
+	runtime: int  # Minutes
+	disk_mb: int  # Size of the outputs
+
+
+def sample_fastq(path: Union[Path, str], *, n_records: int = 2000, sample_bytes: int = 2**20) -> FastqSample:
+	"""
+	Decompress the start of a (compressed) FASTQ file and parse its first records
+	:param n_records: Maximum number of records to parse
+	:param sample_bytes: Number of compressed bytes to read
+	"""
+	path = Path(path)
+	with path.open('rb') as f:
+		raw = f.read(sample_bytes)
+	
+	opener = openers[path.suffix[1:]]
+	if opener is open:
+		data = raw
+	else:
+		data = bytearray()
+		try:
+			with opener(io.BytesIO(raw), 'rb') as f:
+				for chunk in iter(lambda: f.read1(2**16), b''):
+					data += chunk
+		except EOFError:
+			# The sample ends in the middle of a compressed stream. Block-based formats like bz2 need larger samples
+			pass
+	
+	lines = bytes(data).split(b'\n')
+	n_complete = (len(lines) - 1) // 4  # The last line is incomplete or empty
+	records = list(iter_fq(line.decode() for line in lines[:4 * min(n_complete, n_records)]))
+	len_records = sum(map(len, lines[:4 * n_complete])) + 4 * n_complete
+	return FastqSample(
+		records,
+		ratio=len(data) / len(raw) if raw else 1.,
+		bytes_per_record=len_records / n_complete if n_complete else 1.,
+	)
+
+
+def measure_library(
+	paths: Sequence[Union[Path, str]],
+	bc_file: Union[Path, str],
+	linker_file: Optional[Union[Path, str]] = None,
+	*,
+	n_records: int = 2000,
+) -> LibraryStats:
+	"""
+	Estimate the number of reads, barcode rate and tagging speed of a library from the start of its read files
+	:param paths: One or two (compressed) FASTQ files
+	:param n_records: Number of records to tag
+	"""
+	samples = [sample_fastq(path, n_records=n_records) for path in paths]
+	sample = samples[0]
+	size_in = sum(Path(path).stat().st_size for path in paths)
+	# Exact if the sample is the whole file
+	n_reads = round(Path(paths[0]).stat().st_size * sample.ratio / sample.bytes_per_record)
+	
+	bcs, len_linker = read_barcodes(bc_file, linker_file)
+	taggers = [get_tagger(bcs, len_linker) for _ in paths]
+	n_tagged = min(len(s.records) for s in samples)
+	n_regular = 0
+	start = time.perf_counter()
+	for records in zip(*(s.records[:n_tagged] for s in samples)):
+		n_regular += all(tagger.tag_read(*record).is_regular for tagger, record in zip(taggers, records))
+	elapsed = time.perf_counter() - start
+	
+	return LibraryStats(
+		n_reads=n_reads,
+		size_in=size_in,
+		ratio=sample.ratio,
+		len_read=sum(len(seq) for _, seq, _ in sample.records) / len(sample.records) if sample.records else 0.,
+		rate_regular=n_regular / n_tagged if n_tagged else 0.,
+		tag_rate=n_tagged / elapsed if elapsed else 0.,
+	)
+
+
+def estimate_resources(
+	stats: LibraryStats,
+	*,
+	n_amplicons: int,
+	n_shards: int = 1,
+	cache_size: int = 0,
+	tagged_format: str = 'fastq',
+	compression: str = 'gz',
+	compression_threads: Optional[int] = None,
+	map_threads: int = 4,
+) -> Dict[str, Resources]:
+	"""
+	Resources of the per-library rules, or per-shard rules when a library is split into shards
+	:param n_amplicons: Number of amplicons including the pseudo-amplicons for unmapped reads
+	:return: Resources by rule name
+	"""
+	def minutes(seconds: float) -> int:
+		return max(1, math.ceil(seconds / 60))
+	
+	def mb(n_bytes: float) -> int:
+		return max(1, math.ceil(n_bytes / 2**20))
+	
+	n_reads = stats.n_reads / n_shards
+	n_tagged = n_reads * stats.rate_regular
+	size_shard = stats.size_in / n_shards
+	tagged_compression = compression if tagged_format == 'fastq' else tagged_format
+	size_tagged = size_shard * stats.rate_regular * COMPRESSED_SIZE[tagged_compression]
+	tag_threads = max(1, compression_threads or 1)
+	map_threads = max(1, min(map_threads, math.ceil(n_tagged / 1e6)))  # Small libraries don’t need many threads
+	n_heatmaps = 2 * (n_amplicons + 1)  # Per counting: all and L×R for each amplicon and the library
+	heatmap_threads = max(1, min(4, n_heatmaps // 20))
+	
+	resources = dict(
+		trim_quality=Resources(1, 200, minutes(stats.n_reads / THROUGHPUT['trim_quality']), mb(stats.size_in)),
+		tag_reads=Resources(
+			tag_threads,
+			# The cache stores reads and their matches, a few hundred bytes per entry
+			300 + mb(cache_size * 500) + 100 * (tag_threads - 1),
+			minutes(1.5 * n_reads / stats.tag_rate) if stats.tag_rate else minutes(n_reads / 10_000),
+			mb(size_tagged),
+		),
+		build_index=Resources(1, 200, 1, 10),
+		map_reads=Resources(
+			map_threads,
+			300 + 50 * map_threads,
+			minutes(n_tagged / THROUGHPUT['map_reads'] / map_threads),
+			mb(n_tagged * (stats.len_read + 20)),  # One line with amplicon and sequence per read
+		),
+		count_library=Resources(
+			1,
+			500 + 5 * n_amplicons,
+			minutes(stats.n_reads * stats.rate_regular / THROUGHPUT['count_library']),
+			mb(n_amplicons * 2**15),  # Sparse count tables
+		),
+		heatmaps_library=Resources(
+			heatmap_threads,
+			300 * heatmap_threads,
+			minutes(n_heatmaps * SECONDS_PER_HEATMAP / heatmap_threads),
+			mb(n_heatmaps * (2**16 + 2**15)),  # Matrices and heatmaps
+		),
+	)
+	# Both reads are mapped while counting
+	map_count = [resources['map_reads']] * 2 + [resources['count_library']]
+	resources['map_count_library'] = Resources(
+		sum(r.threads for r in map_count),
+		sum(r.mem_mb for r in map_count),
+		max(r.runtime for r in map_count),
+		sum(r.disk_mb for r in map_count),
+	)
+	if n_shards > 1:
+		resources.update(
+			split_reads=Resources(1, 200, minutes(stats.n_reads / THROUGHPUT['split_reads']), mb(stats.size_in)),
+			count_shard=Resources(1, 500, minutes(n_tagged / THROUGHPUT['count_library']), 10),
+			# Only merges the shards’ counts
+			count_library=resources['count_library']._replace(runtime=1),
+		)
+	return resources
+
+
+def get_library_inputs(data_dir: Path, library: str) -> Tuple[List[Path], Path, Optional[Path]]:
+	"""Read files, barcode file and linker file of a library, relative to the data directory"""
+	paths_reads = [Path('in', 'reads', f'{library}_R{read}_001.fastq.gz') for read in [1, 2]]
+	path_barcodes = get_input_seq_paths(data_dir, 'barcodes', [library])[library]
+	path_linkers = Path('in', 'linkers.fa')
+	return paths_reads, path_barcodes, path_linkers if (data_dir / path_linkers).is_file() else None
+
+
+def load_library_stats(data_dir: Path, library: str, *, force: bool = False) -> LibraryStats:
+	"""
+	Load the cached measurements of a library, or measure and cache them if they’re missing or outdated
+	:param data_dir: Data directory with an ``in`` directory
+	:param force: Always measure the library
+	"""
+	path = data_dir / ESTIMATES_PATH
+	paths_reads, path_barcodes, path_linkers = get_library_inputs(data_dir, library)
+	# Adding, changing or removing the linker file changes the barcode rate too
+	inputs = {str(p): get_stamp(data_dir / p) for p in [*paths_reads, path_barcodes, Path('in', 'linkers.fa')]}
+	
+	try:
+		cached = json.loads(path.read_text())
+	except (FileNotFoundError, ValueError):
+		cached = {}
+	entry = cached.get(library)
+	if not force and entry and entry['inputs'] == json.loads(json.dumps(inputs)):
+		try:
+			return LibraryStats(**entry['stats'])
+		except TypeError:  # From an older version
+			pass
+	
+	stats = measure_library(
+		[data_dir / p for p in paths_reads], data_dir / path_barcodes, path_linkers and data_dir / path_linkers,
+	)
+	cached[library] = dict(stats=stats._asdict(), inputs=inputs)
+	write_json_atomic(path, cached)
+	return stats
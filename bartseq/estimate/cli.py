@@ -0,0 +1,51 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from ..cli_helpers import CLI
+
+
+class EstimateCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'data_dir', nargs='?', type=Path, default=Path('.'),
+			help='Data directory to read from. Needs to have the directories “./in/{reads,amplicons,barcodes}” filled')
+		parser.add_argument(
+			'--library', '-l', dest='libraries', action='append',
+			help='Library to estimate. Can be specified multiple times. Default: All libraries')
+		parser.add_argument(
+			'--shards', type=int, default=1,
+			help='Number of shards each library is split into (see the “shards” config option)')
+		parser.add_argument(
+			'--cache-size', type=int, default=0,
+			help='Size of the tagger’s cache (see the “tagger-cache-size” config option)')
+		parser.add_argument(
+			'--force', '-f', action='store_true',
+			help='Measure libraries even if their inputs didn’t change')
+		return parser
+	
+	@staticmethod
+	def run(parser: ArgumentParser, args: Namespace):
+		from . import load_library_stats, estimate_resources
+		from ..counter import PSEUDO_AMPLICONS
+		from ..manifest import load_manifest
+		
+		manifest = load_manifest(args.data_dir)
+		for lib in args.libraries or manifest.libraries:
+			if lib not in manifest.amplicons:
+				parser.error(f'Unknown library {lib!r}, use one of {", ".join(manifest.libraries)}')
+			stats = load_library_stats(args.data_dir, lib, force=args.force)
+			print(
+				f'{lib}: ~{stats.n_reads} reads, {stats.rate_regular:.1%} with barcodes, '
+				f'tagging {stats.tag_rate:.0f} reads/s'
+			)
+			resources = estimate_resources(
+				stats, n_amplicons=len(manifest.amplicons[lib]) + len(PSEUDO_AMPLICONS),
+				n_shards=args.shards, cache_size=args.cache_size,
+			)
+			print('', 'rule', *resources['tag_reads']._fields, sep='\t')
+			for rule, res in resources.items():
+				print('', rule, *res, sep='\t')
+
+
+cli = EstimateCLI()
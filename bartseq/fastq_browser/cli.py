@@ -1,11 +1,20 @@
-from argparse import ArgumentParser, Namespace
+from argparse import ArgumentParser, Namespace, ArgumentTypeError
 from pathlib import Path
+from typing import Tuple, Optional
 
 from .main import main
 from ..io import openers
 from ..cli_helpers import CLI, t_out_file, clean_kbdinterrupt, suggest_library
 
 
+def t_range(r: str) -> Tuple[Optional[int], Optional[int]]:
+	try:
+		start, stop = r.split(':')
+		return int(start) if start else None, int(stop) if stop else None
+	except ValueError:
+		raise ArgumentTypeError(f'Invalid range {r!r}, needs to look like “START:STOP”, “START:” or “:STOP”')
+
+
 class FastqBrowserCLI(CLI):
 	@staticmethod
 	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
@@ -22,6 +31,15 @@ class FastqBrowserCLI(CLI):
 		parser.add_argument(
 			'--out-compression', '-o', choices=openers.keys(),
 			help='Specify compression if writing to stdout or a file with unusual suffix')
+		parser.add_argument(
+			'--barcode', '-b',
+			help='Only output read pairs with a barcode (e.g. “L01”) or barcode pair (e.g. “L01,R03”)')
+		parser.add_argument(
+			'--amplicon', '-a',
+			help='Only output read pairs with at least one read mapped to this amplicon')
+		parser.add_argument(
+			'--range', '-r', dest='read_range', type=t_range,
+			help='Only output read pairs with numbers in START:STOP (zero-based, STOP excluded)')
 		return parser
 	
 	@staticmethod
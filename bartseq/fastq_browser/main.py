@@ -1,10 +1,12 @@
 import re
-from itertools import cycle
+from itertools import count
 from pathlib import Path
-from typing import TextIO, Union
+from typing import TextIO, Union, Optional, Tuple, List, Iterator, Generator
 
 from tqdm import tqdm
 
+from ..bts import is_bts, iter_bts_fq, tagged_read_paths
+from ..index import ReadIndex, barcode_matches, index_mapping, iter_fq_block, iter_lines_block
 from ..io import transparent_open, iter_fq
 
 
@@ -14,36 +16,94 @@ fields = [
 ]
 RE_FIELDS = re.compile(f'(?P<field>{"|".join(fields)})=(?P<value>[^ ]*)')
 
+Record = Tuple[Tuple[str, str, str], str]  # FASTQ record and mapping line
 
-def interleave(*iterables):
-	unexhausted = set(range(len(iterables)))
-	for i, it in cycle(enumerate(map(iter, iterables))):
-		if not unexhausted:
-			break
-		try:
-			yield i, next(it)
-		except StopIteration:
-			unexhausted -= {i}
 
+def iter_tagged(path: Path) -> Generator[Tuple[str, str, str], None, None]:
+	if is_bts(path):
+		yield from iter_bts_fq(path)
+	else:
+		with transparent_open(path) as f:
+			yield from iter_fq(f)
 
-def main(data_dir: Path, library: str, out: Union[Path, str, TextIO], out_compression: str):
+
+def iter_all(paths_fsq: List[Path], paths_map: List[Path]) -> Generator[Tuple[int, List[Record]], None, None]:
+	with \
+			transparent_open(paths_map[0]) as map_r1, \
+			transparent_open(paths_map[1]) as map_r2:
+		yield from zip(count(), map(list, zip(
+			zip(iter_tagged(paths_fsq[0]), map_r1),
+			zip(iter_tagged(paths_fsq[1]), map_r2),
+		)))
+
+
+def iter_indexed(
+	paths_fsq: List[Path],
+	paths_map: List[Path],
+	index: ReadIndex,
+	blocks: Iterator[int],
+) -> Generator[Tuple[int, List[Record]], None, None]:
+	idx_maps = [index_mapping(path_map, index.block_size) for path_map in paths_map]
+	for b in blocks:
+		block = index.blocks[b]
+		yield from zip(count(block.start), map(list, zip(*(
+			zip(
+				iter_fq_block(path_fsq, offset, block.n_records),
+				iter_lines_block(path_map, idx_map.offsets[b], block.n_records),
+			)
+			for path_fsq, path_map, idx_map, offset in zip(paths_fsq, paths_map, idx_maps, block.offsets)
+		))))
+
+
+def select_blocks(
+	index: ReadIndex,
+	paths_map: List[Path],
+	barcode: Optional[str],
+	amplicon: Optional[str],
+	read_range: Optional[Tuple[Optional[int], Optional[int]]],
+) -> List[int]:
+	blocks = set(range(len(index.blocks)))
+	if barcode:
+		blocks &= index.select_barcode(barcode)
+	if amplicon:
+		blocks &= set.union(*(index_mapping(p, index.block_size).select_amplicon(amplicon) for p in paths_map))
+	if read_range:
+		blocks &= index.select_range(*read_range)
+	return sorted(blocks)
+
+
+def main(
+	data_dir: Path,
+	library: str,
+	out: Union[Path, str, TextIO],
+	out_compression: str,
+	*,
+	barcode: Optional[str] = None,
+	amplicon: Optional[str] = None,
+	read_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+):
 	dir_process = data_dir / 'process'
 	dir_tagged = dir_process / '3-tagged'
 	dir_mapped = dir_process / '4-mapped'
 	
-	paths_fsq = [dir_tagged / f'{library}_R{r}.fastq.gz' for r in [1, 2]]
+	paths_fsq = tagged_read_paths(dir_tagged, library)
 	paths_map = [dir_mapped / f'{library}_R{r}.tsv' for r in [1, 2]]
+	path_index = dir_tagged / f'{library}_index.json'
 	path_count = dir_process / '1-index' / f'{library}.count.txt'
 	
-	with path_count.open() as c_f:
-		n_pairs = int(c_f.read())
+	if (barcode or amplicon or read_range) and path_index.is_file():
+		index = ReadIndex.load(path_index)
+		blocks = select_blocks(index, paths_map, barcode, amplicon, read_range)
+		n_pairs = sum(index.blocks[b].n_records for b in blocks)
+		pairs = iter_indexed(paths_fsq, paths_map, index, blocks)
+	else:
+		with path_count.open() as c_f:
+			n_pairs = int(c_f.read())
+		pairs = iter_all(paths_fsq, paths_map)
 	
-	with \
-			transparent_open(paths_fsq[0]) as fsq_r1, \
-			transparent_open(paths_fsq[1]) as fsq_r2, \
-			transparent_open(paths_map[0]) as map_r1, \
-			transparent_open(paths_map[1]) as map_r2, \
-			transparent_open(out, 'wt', suffix=out_compression, ensure_parentdir=True) as f_out:
+	start, stop = read_range or (None, None)
+	
+	with transparent_open(out, 'wt', suffix=out_compression, ensure_parentdir=True) as f_out:
 		print(
 			'read',
 			'header', 'read_seq', 'quality_seq',
@@ -53,18 +113,27 @@ def main(data_dir: Path, library: str, out: Union[Path, str, TextIO], out_compre
 			sep='\t', file=f_out,
 		)
 		
-		for read_side, ((header, read, qual), mapping) in tqdm(interleave(
-			zip(iter_fq(fsq_r1), map_r1),
-			zip(iter_fq(fsq_r2), map_r2),
-		), total=2 * n_pairs):
-			fields = list(RE_FIELDS.finditer(header))
-			amp, match = mapping.strip().split('\t')
+		for r, records in tqdm(pairs, total=n_pairs):
+			if start is not None and r < start:
+				continue
+			if stop is not None and r >= stop:
+				break
 			
-			print(
-				read_side + 1,
-				header[:fields[0].start() - 1],
-				read, qual,
-				amp, len(match),
-				*[v if v != 'None' else '' for v in (m.group('value') for m in fields)],
-				sep='\t', file=f_out,
-			)
+			parsed = [
+				(header, read, qual, list(RE_FIELDS.finditer(header)), *mapping.strip().split('\t'))
+				for (header, read, qual), mapping in records
+			]
+			if amplicon and not any(amp == amplicon for *_, amp, match in parsed):
+				continue
+			if barcode and not barcode_matches(barcode, (matches[0].group('value') for *_, matches, _, _ in parsed)):
+				continue
+			
+			for read_side, (header, read, qual, matches, amp, match) in enumerate(parsed):
+				print(
+					read_side + 1,
+					header[:matches[0].start() - 1],
+					read, qual,
+					amp, len(match),
+					*[v if v != 'None' else '' for v in (m.group('value') for m in matches)],
+					sep='\t', file=f_out,
+				)
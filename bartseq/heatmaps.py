@@ -1,3 +1,8 @@
+from math import ceil
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Union, Dict, Iterable, Tuple, Optional, List
+
 import numpy as np
 import pandas as pd
 
@@ -11,6 +16,16 @@ from plotnine import (
 )
 
 
+EMPTY_PNG = (
+	b'\x89PNG\r\n\x1a\n'
+	b'\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x04\x00\x00\x00\xb5\x1c\x0c\x02'
+	b'\x00\x00\x00\x0bIDATx\xdacd`\x00\x00\x00\x06\x00\x020\x81\xd0/'
+	b'\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+
+Tables = Union[pd.DataFrame, Dict[str, pd.DataFrame]]
+
+
 def bc_range(bc_series: pd.Series):
 	prefixes = set(bc[0] for bc in bc_series)
 	r = []
@@ -39,3 +54,95 @@ def plot_counts(counts: pd.DataFrame):
 		+ theme(axis_text_x=element_text(angle=90, vjust=.5))
 		+ labs(x='Right Barcode', y='Left Barcode')
 	)
+
+
+def bc_order(labels: Iterable[str]) -> List[str]:
+	"""Barcodes in :func:`bc_range` order, but only the ones that occur"""
+	labels = set(labels)
+	return [bc for bc in bc_range(pd.Series(sorted(labels))) if bc in labels] if labels else []
+
+
+def render_heatmap(
+	path: Union[Path, str],
+	tables: Tables,
+	*,
+	ncol: int = 4,
+	dpi: int = 300,
+	fontsize: Optional[float] = None,
+):
+	"""
+	Render log-scaled bc_l × bc_r count matrices to a PNG, like :func:`plot_counts`, but with a fast raster path
+	:param path: PNG file to write to
+	:param tables: Wide count matrix or a dict of them (one facet each, e.g. per amplicon)
+	:param ncol: Number of facet columns
+	:param dpi: Resolution of the PNG
+	:param fontsize: Size of the barcode labels. Default: 4 for a single matrix, 1.8 for facets
+	"""
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	
+	faceted = isinstance(tables, dict)
+	if not faceted:
+		tables = {'': tables}
+	if fontsize is None:
+		fontsize = 1.8 if faceted else 4
+	
+	if sum(int(table.notna().sum().sum()) for table in tables.values()) <= 2:
+		Path(path).write_bytes(EMPTY_PNG)
+		return
+	
+	# Facets share their axes, so each matrix gets the same rows and columns
+	rows = bc_order(bc for table in tables.values() for bc in table.index)
+	cols = bc_order(bc for table in tables.values() for bc in table.columns)
+	logs = {
+		name: np.log(table.reindex(index=rows, columns=cols).to_numpy(dtype=float))
+		for name, table in tables.items()
+	}
+	all_logs = np.concatenate([log.ravel() for log in logs.values()])
+	vmin, vmax = np.nanmin(all_logs), np.nanmax(all_logs)
+	
+	fig = Figure(figsize=(6.4, 4.8))
+	FigureCanvasAgg(fig)
+	nrow = ceil(len(logs) / ncol) if faceted else 1
+	axes = list(fig.subplots(nrow, ncol if faceted else 1, sharex=True, sharey=True, squeeze=False).flat)
+	image = None
+	for ax, (name, log) in zip(axes, logs.items()):
+		image = ax.imshow(
+			np.ma.masked_invalid(log), cmap='inferno', vmin=vmin, vmax=vmax,
+			origin='lower', interpolation='nearest',
+		)
+		if name:
+			ax.set_title(name, fontsize=fontsize * 2)
+		ax.set_xticks(range(len(cols)))
+		ax.set_xticklabels(cols, rotation=90, fontsize=fontsize)
+		ax.set_yticks(range(len(rows)))
+		ax.set_yticklabels(rows, fontsize=fontsize)
+	for ax in axes[len(logs):]:
+		ax.set_visible(False)
+	
+	# Figure.sup[xy]label need matplotlib 3.4, which doesn’t support all our Python versions
+	fig.text(.5, .01, 'Right Barcode', ha='center', va='bottom')
+	fig.text(.01, .5, 'Left Barcode', ha='left', va='center', rotation='vertical')
+	fig.colorbar(image, ax=fig.axes, label='log(Count)')
+	fig.savefig(path, dpi=dpi)
+
+
+def _render_heatmap_job(job: Tuple[Union[Path, str], Tables]):
+	path, tables = job
+	render_heatmap(path, tables)
+
+
+def render_heatmaps(jobs: Iterable[Tuple[Union[Path, str], Tables]], processes: Optional[int] = None):
+	"""
+	Render many heatmaps (see :func:`render_heatmap`) using a process pool
+	:param jobs: Pairs of PNG path and count matrix or dict of count matrices
+	:param processes: Number of worker processes. Default: Number of CPUs. “1” means no pool
+	"""
+	if processes == 1:
+		for job in jobs:
+			_render_heatmap_job(job)
+		return
+	# Forking a multi-threaded process (e.g. Snakemake) can deadlock, so start fresh interpreters
+	with get_context('spawn').Pool(processes) as pool:
+		for _ in pool.imap_unordered(_render_heatmap_job, jobs):
+			pass
@@ -0,0 +1,161 @@
+"""Sidecar indices for random access into tagged read files and their mappings"""
+import json
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple, Tuple, List, Dict, Optional, Sequence, Iterable, Set, Union, Generator
+
+from .bts import BtsWriter, is_bts, iter_bts_fq
+from .io import BlockWriter, transparent_open, iter_fq
+from .read_tagger.io import write_tagged
+
+
+class Block(NamedTuple):
+	start: int  # Number of the first record in the block
+	n_records: int
+	offsets: Tuple[int, ...]  # Compressed byte offset of the block in each read file
+
+
+def barcode_key(barcodes: Iterable[Optional[str]]) -> str:
+	# We don’t know which read is “the left one”, so e.g. (L3,R4) == (R4,L3)
+	return ','.join(sorted(bc or '' for bc in barcodes))
+
+
+def barcode_matches(wanted: str, barcodes: Iterable[Optional[str]]) -> bool:
+	"""Check if barcodes are a pair like “L01,R03” or contain a single barcode like “L01”"""
+	barcodes = list(barcodes)
+	if ',' in wanted:
+		return barcode_key(wanted.split(',')) == barcode_key(barcodes)
+	return wanted in barcodes
+
+
+class ReadIndex:
+	def __init__(
+		self,
+		block_size: int,
+		blocks: Iterable[Block] = (),
+		barcodes: Optional[Dict[str, List[int]]] = None,
+	):
+		self.block_size = block_size
+		self.blocks = list(blocks)
+		self.barcodes = {} if barcodes is None else barcodes
+	
+	@property
+	def n_records(self) -> int:
+		return sum(block.n_records for block in self.blocks)
+	
+	def select_barcode(self, wanted: str) -> Set[int]:
+		return {
+			b for key, blocks in self.barcodes.items()
+			if barcode_matches(wanted, key.split(','))
+			for b in blocks
+		}
+	
+	def select_range(self, start: Optional[int], stop: Optional[int]) -> Set[int]:
+		start = 0 if start is None else start
+		stop = self.n_records if stop is None else stop
+		return {
+			b for b, block in enumerate(self.blocks)
+			if block.start < stop and start < block.start + block.n_records
+		}
+	
+	def save(self, path: Union[Path, str]):
+		with transparent_open(path, 'wt', ensure_parentdir=True) as f:
+			json.dump(dict(
+				block_size=self.block_size,
+				blocks=[block._asdict() for block in self.blocks],
+				barcodes=self.barcodes,
+			), f)
+	
+	@classmethod
+	def load(cls, path: Union[Path, str]) -> 'ReadIndex':
+		with transparent_open(path, 'rt') as f:
+			data = json.load(f)
+		blocks = [Block(b['start'], b['n_records'], tuple(b['offsets'])) for b in data['blocks']]
+		return cls(data['block_size'], blocks, data['barcodes'])
+
+
+class ReadIndexer:
+	"""Writes tagged reads (one per output file) in independently compressed blocks and indexes them"""
+	def __init__(self, writers: Sequence[Union[BlockWriter, BtsWriter]], index_file: Union[Path, str], block_size: int):
+		self.writers = writers
+		self.index_file = index_file
+		self.index = ReadIndex(block_size)
+		self.n_records = 0
+		self.n_in_block = 0
+		self.block_barcodes: Set[str] = set()
+	
+	def write(self, *reads):
+		for writer, read in zip(self.writers, reads):
+			write_tagged(writer, read)
+		self.block_barcodes.add(barcode_key(read.barcode for read in reads))
+		self.n_in_block += 1
+		if self.n_in_block == self.index.block_size:
+			self.flush()
+	
+	def flush(self):
+		if self.n_in_block == 0:
+			return
+		offsets = tuple(writer.flush_block() for writer in self.writers)
+		block_no = len(self.index.blocks)
+		self.index.blocks.append(Block(self.n_records, self.n_in_block, offsets))
+		for key in self.block_barcodes:
+			self.index.barcodes.setdefault(key, []).append(block_no)
+		self.n_records += self.n_in_block
+		self.n_in_block = 0
+		self.block_barcodes.clear()
+	
+	def close(self):
+		self.flush()
+		self.index.save(self.index_file)
+
+
+class MappingIndex(NamedTuple):
+	block_size: int
+	offsets: List[int]  # Byte offset of the first line of each block
+	amplicons: Dict[str, List[int]]  # Blocks containing reads mapped to an amplicon
+	
+	def select_amplicon(self, amplicon: str) -> Set[int]:
+		return set(self.amplicons.get(amplicon, ()))
+
+
+def index_mapping(path: Path, block_size: int) -> MappingIndex:
+	"""Index a mapping TSV in blocks matching the ones of the tagged reads. The index is cached next to it."""
+	path_cache = path.with_name(f'{path.name}.idx.json')
+	if path_cache.is_file() and path_cache.stat().st_mtime >= path.stat().st_mtime:
+		idx = MappingIndex(**json.loads(path_cache.read_text()))
+		if idx.block_size == block_size:
+			return idx
+	
+	offsets = []
+	amplicons = {}
+	offset = 0
+	with path.open('rb') as f:
+		for i, line in enumerate(f):
+			block_no, pos = divmod(i, block_size)
+			if pos == 0:
+				offsets.append(offset)
+			blocks = amplicons.setdefault(line.split(b'\t', 1)[0].strip().decode(), [])
+			if not blocks or blocks[-1] != block_no:
+				blocks.append(block_no)
+			offset += len(line)
+	
+	idx = MappingIndex(block_size, offsets, amplicons)
+	path_cache.write_text(json.dumps(idx._asdict()))
+	return idx
+
+
+def iter_fq_block(path: Path, offset: int, n_records: int) -> Generator[Tuple[str, str, str], None, None]:
+	if is_bts(path):
+		yield from islice(iter_bts_fq(path, offset), n_records)
+		return
+	with path.open('rb') as raw:
+		raw.seek(offset)
+		with transparent_open(raw, 'rt', suffix=path.suffix[1:]) as f:
+			yield from islice(iter_fq(f), n_records)
+
+
+def iter_lines_block(path: Path, offset: int, n_lines: int) -> Generator[str, None, None]:
+	with path.open('rb') as f:
+		f.seek(offset)
+		for line in islice(f, n_lines):
+			yield line.decode()
@@ -1,18 +1,86 @@
 import gzip
+import io
+import json
 import lzma
 import bz2
+import os
 from collections import defaultdict
+from functools import partial
 from pathlib import Path
-from typing import Union, Optional, Iterable, Tuple, Generator
+from typing import Union, Optional, Iterable, Tuple, Generator, List, BinaryIO, TextIO
 
 
+def open_zst(
+	file: Union[str, BinaryIO],
+	mode: str = 'rb',
+	*,
+	level: int = 3,
+	threads: int = 0,
+	encoding: Optional[str] = None,
+	errors: Optional[str] = None,
+	newline: Optional[str] = None,
+):
+	"""
+	Open a Zstandard compressed file. Reads across frames, so files written by :class:`BlockWriter` work.
+	:param threads: Number of compression threads. ``-1`` uses all cores
+	"""
+	import zstandard
+	
+	owns_file = isinstance(file, str)
+	raw = open(file, mode.replace('t', '').rstrip('b') + 'b') if owns_file else file
+	if mode.startswith('r'):
+		f = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=owns_file)
+		f = io.BufferedReader(f)
+	else:
+		f = zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(raw, closefd=owns_file)
+	if 'b' in mode:
+		return f
+	return io.TextIOWrapper(f, encoding=encoding, errors=errors, newline=newline)
+
+
+def open_lz4(file: Union[str, BinaryIO], mode: str = 'rb', **kwargs):
+	import lz4.frame
+	return lz4.frame.open(file, mode, **kwargs)
+
+
+def compress_zst(data: bytes, level: int = 3, threads: int = 0) -> bytes:
+	import zstandard
+	return zstandard.ZstdCompressor(level=level, threads=threads).compress(data)
+
+
+def compress_lz4(data: bytes, compression_level: int = 0) -> bytes:
+	import lz4.frame
+	return lz4.frame.compress(data, compression_level=compression_level)
+
+
+# zst and lz4 need the zstandard and lz4 packages, which are only imported when used
 openers = dict(
 	gz=gzip.open,
 	xz=lzma.open,
 	bz2=bz2.open,
+	zst=open_zst,
+	lz4=open_lz4,
 )
 openers = defaultdict(lambda: open, **openers)
 
+# Compressors producing complete streams that can be concatenated
+compressors = dict(
+	gz=gzip.compress,
+	xz=lzma.compress,
+	bz2=bz2.compress,
+	zst=compress_zst,
+	lz4=compress_lz4,
+)
+
+# Name of the compression level argument of the openers and compressors
+level_args = dict(
+	gz='compresslevel',
+	xz='preset',
+	bz2='compresslevel',
+	zst='level',
+	lz4='compression_level',
+)
+
 
 def transparent_open(
 	file: Union[Path, str, Iterable[bytes]],
@@ -22,7 +90,9 @@ def transparent_open(
 	encoding: Optional[str] = None,
 	errors: Optional[str] = None,
 	newline: Optional[str] = None,
-	suffix: str = None
+	suffix: str = None,
+	level: Optional[int] = None,
+	threads: Optional[int] = None,
 ) -> Iterable[Union[str, bytes]]:
 	"""
 	Open potentially compressed file
@@ -32,7 +102,9 @@ def transparent_open(
 	:param encoding: Encoding of the text data the file decompresses to (or contains if the file is uncompressed)
 	:param errors: See ``open``
 	:param newline: See ``open``
-	:param suffix: See ``open``
+	:param suffix: Compression (one of :data:`openers`), by default the suffix of the file path
+	:param level: Compression level when writing. The range depends on the compression
+	:param threads: Number of compression threads when writing. Only supported for zst
 	:return: File-like object with decompressed data
 	"""
 	if isinstance(file, (str, Path)):
@@ -44,15 +116,98 @@ def transparent_open(
 	
 	opener = openers[suffix]
 	
+	kwargs = {}
+	if not mode.startswith('r') and opener is not open:
+		if level is not None:
+			kwargs[level_args[suffix]] = level
+		if threads is not None:
+			if opener is not open_zst:
+				raise ValueError(f'Only zst supports multiple compression threads, not {suffix}')
+			kwargs['threads'] = threads
+	
 	if not isinstance(file, str) and opener is open:
 		return file
 	else:
 		try:
-			return opener(file, mode, encoding=encoding, errors=errors, newline=newline)
+			return opener(file, mode, encoding=encoding, errors=errors, newline=newline, **kwargs)
 		except TypeError as e:
 			raise TypeError(f'Error in opener {opener}') from e
 
 
+class BlockWriter:
+	"""
+	Text file writer that compresses its content in independent blocks.
+	
+	The result is a valid multi-stream compressed file,
+	but every block can also be decompressed on its own by seeking to its offset.
+	"""
+	def __init__(
+		self,
+		file: Union[Path, str, BinaryIO, TextIO],
+		compression: str,
+		*,
+		ensure_parentdir: bool = False,
+		encoding: str = 'utf-8',
+		level: Optional[int] = None,
+		threads: Optional[int] = None,
+	):
+		if compression not in compressors:
+			raise ValueError(f'Cannot write blocks with compression {compression!r}, use one of {", ".join(compressors)}')
+		self.compress = compressors[compression]
+		if level is not None:
+			self.compress = partial(self.compress, **{level_args[compression]: level})
+		if threads is not None:
+			if compression != 'zst':
+				raise ValueError(f'Only zst supports multiple compression threads, not {compression}')
+			self.compress = partial(self.compress, threads=threads)
+		self.encoding = encoding
+		if isinstance(file, (str, Path)):
+			if ensure_parentdir:
+				Path(file).parent.mkdir(parents=True, exist_ok=True)
+			self.file = open(file, 'wb')
+			self.owns_file = True
+		else:
+			self.file = getattr(file, 'buffer', file)
+			self.owns_file = False
+		self.offset = 0
+		self.buffer: List[bytes] = []
+	
+	def write(self, text: str):
+		self.buffer.append(text.encode(self.encoding))
+	
+	def flush_block(self) -> int:
+		"""Compress and write the current block and return the offset it starts at"""
+		start = self.offset
+		if self.buffer:
+			data = self.compress(b''.join(self.buffer))
+			self.file.write(data)
+			self.offset += len(data)
+			self.buffer.clear()
+		return start
+	
+	def close(self):
+		self.flush_block()
+		if self.owns_file:
+			self.file.close()
+		else:
+			self.file.flush()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *exc):
+		self.close()
+
+
+def write_json_atomic(path: Path, data: dict):
+	"""Write to a temporary file first, so readers never see a half-written file"""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	path_tmp = path.with_name(f'.{path.name}.tmp')
+	with path_tmp.open('w') as f:
+		json.dump(data, f, indent='\t')
+	os.replace(path_tmp, path)
+
+
 def parse_fq(line_header: str, line_seq: str, line_plus: str, line_qual: str) -> Tuple[str, str, str]:
 	header = line_header.strip()
 	assert header.startswith('@')
@@ -71,6 +226,72 @@ def iter_fq(lines: Iterable[str]) -> Generator[Tuple[str, str, str], None, None]
 			raise IOError(f'Fastq file doesn’t contain new line after header {header}')
 
 
+class FastqSkipper:
+	"""
+	Reads FASTQ records from a binary stream and skips records without parsing them.
+	
+	Skipping only counts line breaks in large decompressed chunks,
+	which is much faster than iterating lines when most records are skipped.
+	"""
+	def __init__(self, file: BinaryIO, chunk_size: int = 2**20, encoding: str = 'utf-8'):
+		self.file = getattr(file, 'buffer', file)
+		self.chunk_size = chunk_size
+		self.encoding = encoding
+		self.chunk = b''
+		self.pos = 0
+		self.line_len = 64  # Estimate to only count line breaks where the skipped records probably end
+	
+	def fill(self) -> bool:
+		self.chunk = self.file.read(self.chunk_size)
+		self.pos = 0
+		return bool(self.chunk)
+	
+	def skip(self, n_records: int) -> int:
+		"""Skip up to ``n_records`` records and return how many were skipped before EOF"""
+		n_lines = to_skip = 4 * n_records
+		while n_lines > 0:
+			if self.pos >= len(self.chunk) and not self.fill():
+				return (to_skip - n_lines) // 4
+			end = min(len(self.chunk), self.pos + n_lines * self.line_len)
+			n_found = self.chunk.count(b'\n', self.pos, end)
+			if n_found < n_lines:
+				n_lines -= n_found
+				self.pos = end
+			else:  # Go back to the last line break to skip
+				for _ in range(n_found - n_lines + 1):
+					end = self.chunk.rfind(b'\n', self.pos, end)
+				self.pos = end + 1
+				n_lines = 0
+		return n_records
+	
+	def readline(self) -> bytes:
+		end = self.chunk.find(b'\n', self.pos)
+		if end >= 0:
+			line = self.chunk[self.pos:end + 1]
+			self.pos = end + 1
+			return line
+		parts = [self.chunk[self.pos:]]
+		while self.fill():
+			end = self.chunk.find(b'\n')
+			if end >= 0:
+				parts.append(self.chunk[:end + 1])
+				self.pos = end + 1
+				break
+			parts.append(self.chunk)
+		return b''.join(parts)
+	
+	def read(self) -> Optional[Tuple[str, str, str]]:
+		"""Parse the next record or return ``None`` at EOF"""
+		line_header = self.readline()
+		if not line_header:
+			return None
+		lines = [line_header] + [self.readline() for _ in range(3)]
+		self.line_len = max(1, sum(map(len, lines)) // 4)
+		if not lines[-1]:
+			raise IOError(f'Fastq file doesn’t contain new line after header {line_header!r}')
+		return parse_fq(*(line.decode(self.encoding) for line in lines))
+
+
 def read_fasta(filename: Union[Path, str]) -> Generator[Tuple[str, str], None, None]:
 	with Path(filename).open() as f_bc:
 		for header in f_bc:
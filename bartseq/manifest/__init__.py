@@ -0,0 +1,100 @@
+"""
+Cached metadata about the libraries of a data directory.
+
+The Snakefile needs the library names, amplicons and barcode length before it can build its DAG.
+Parsing all FASTA files on every start gets slow with many libraries and amplicons,
+so the metadata is cached in ``process/manifest.json`` and only rebuilt if an input changed.
+"""
+import json
+from pathlib import Path
+from typing import NamedTuple, List, Tuple, Dict, Iterable, Optional
+
+from ..cli_helpers import RE_READ_FILE
+from ..io import write_json_atomic
+
+
+MANIFEST_PATH = Path('process', 'manifest.json')
+
+
+class Manifest(NamedTuple):
+	reads: List[Tuple[str, str]]  # Library and read (“1” or “2”) of every input read file
+	amplicons: Dict[str, List[str]]  # Amplicon names by library
+	len_barcode: int
+	inputs: Dict[str, Tuple[int, int]]  # Modification time (ns) and size of the files and directories this is based on
+	
+	@property
+	def libraries(self) -> List[str]:
+		return sorted(lib for lib, read in self.reads if read == '1')
+	
+	def is_current(self, data_dir: Path) -> bool:
+		"""Check if none of the inputs changed. Adding or removing files changes the directory’s modification time"""
+		return all(
+			get_stamp(data_dir / path) == (None if stamp is None else tuple(stamp))
+			for path, stamp in self.inputs.items()
+		)
+
+
+def get_stamp(path: Path) -> Optional[Tuple[int, int]]:
+	try:
+		stat = path.stat()
+	except FileNotFoundError:
+		return None
+	return stat.st_mtime_ns, stat.st_size
+
+
+def get_input_seq_paths(data_dir: Path, seqs_type: str, libraries: Iterable[str]) -> Dict[str, Path]:
+	"""Per-library FASTA files like ``in/amplicons/<libname>.fa``, or ``in/amplicons.fa`` for all libraries"""
+	by_lib = (data_dir / 'in' / seqs_type).is_dir()
+	return {
+		lib: Path('in', seqs_type, f'{lib}.fa') if by_lib else Path('in', f'{seqs_type}.fa')
+		for lib in libraries
+	}
+
+
+def read_fasta_headers(path: Path) -> List[str]:
+	with path.open() as f:
+		return [line[1:].strip() for line in f if line.startswith('>')]
+
+
+def build_manifest(data_dir: Path) -> Manifest:
+	dirs = [Path('in'), Path('in', 'reads'), Path('in', 'amplicons'), Path('in', 'barcodes')]
+	reads = sorted(
+		(match['lib'], match['read'])
+		for match in map(RE_READ_FILE.fullmatch, (p.name for p in (data_dir / 'in' / 'reads').glob('*_R[12]_001.fastq.gz')))
+		if match
+	)
+	libraries = sorted(lib for lib, read in reads if read == '1')
+	paths_amplicons = get_input_seq_paths(data_dir, 'amplicons', libraries)
+	paths_barcodes = get_input_seq_paths(data_dir, 'barcodes', libraries)
+	
+	amplicons = {lib: read_fasta_headers(data_dir / path) for lib, path in paths_amplicons.items()}
+	len_barcode = 0
+	for path in set(paths_barcodes.values()):
+		with (data_dir / path).open() as f:
+			len_barcode = max([len_barcode, *(len(line.strip()) for line in f if not line.startswith('>'))])
+	
+	inputs = {
+		str(path): get_stamp(data_dir / path)
+		for path in [*dirs, *set(paths_amplicons.values()), *set(paths_barcodes.values())]
+	}
+	return Manifest(reads, amplicons, len_barcode, inputs)
+
+
+def load_manifest(data_dir: Path = Path('.'), *, force: bool = False) -> Manifest:
+	"""
+	Load the cached manifest of a data directory, or build and cache it if it’s missing or outdated
+	:param data_dir: Data directory with an ``in`` directory
+	:param force: Always rebuild the manifest
+	"""
+	path = data_dir / MANIFEST_PATH
+	if not force and path.is_file():
+		try:
+			manifest = Manifest(**json.loads(path.read_text()))
+		except (ValueError, TypeError):  # Unreadable or from an older version
+			pass
+		else:
+			if manifest.is_current(data_dir):
+				return manifest
+	manifest = build_manifest(data_dir)
+	write_json_atomic(path, manifest._asdict())
+	return manifest
@@ -0,0 +1,27 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from ..cli_helpers import CLI
+
+
+class ManifestCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'data_dir', nargs='?', type=Path, default=Path('.'),
+			help='Data directory to read from. Needs to have the directories “./in/{reads,amplicons,barcodes}” filled')
+		parser.add_argument(
+			'--force', '-f', action='store_true',
+			help='Rebuild the manifest even if no input changed')
+		return parser
+	
+	@staticmethod
+	def run(parser: ArgumentParser, args: Namespace):
+		from . import load_manifest, MANIFEST_PATH
+		manifest = load_manifest(args.data_dir, force=args.force)
+		print(f'Wrote {args.data_dir / MANIFEST_PATH}: {len(manifest.libraries)} libraries')
+		for lib in manifest.libraries:
+			print('', lib, f'{len(manifest.amplicons[lib])} amplicons', sep='\t')
+
+
+cli = ManifestCLI()
@@ -1,12 +1,14 @@
 from collections import OrderedDict
-from typing import NamedTuple, Iterable, FrozenSet, Tuple, Optional, Generator, Iterator, Dict, Set
+from typing import NamedTuple, Iterable, FrozenSet, Tuple, Optional, Generator, Iterator, Dict, Set, Sequence, List
 
-from ahocorasick import Automaton
 from warnings import warn
 
+import numpy as np
 import pandas as pd
 
 from . import defaults
+from .matchers import Matcher, get_matcher
+from .window import SearchWindow
 
 
 BASES = set('ATGC')
@@ -61,21 +63,26 @@ class TaggedRead(NamedTuple):
 		return seq[ljb:ljba]
 	
 	def __str__(self):
-		return f'''\
-{self.header}\
- barcode={self.barcode}\
- linker={self.linker}\
- multi-bc={self.has_multiple_barcodes}\
- just-primer={self.is_just_primer}\
- other-bcs={",".join(self.other_barcodes) or None}\
- barcode-mismatch={self.barcode_mismatch}\
- junk={self.junk}
-{self.amplicon}
-+
-{self.cut_seq(self.qual)}
+		return format_fastq(self, self.cut_seq(self.qual))
+
+
+def format_tags(read) -> str:
+	return f'''\
+ barcode={read.barcode}\
+ linker={read.linker}\
+ multi-bc={read.has_multiple_barcodes}\
+ just-primer={read.is_just_primer}\
+ other-bcs={",".join(read.other_barcodes) or None}\
+ barcode-mismatch={read.barcode_mismatch}\
+ junk={read.junk}\
 '''
 
 
+def format_fastq(read, qual: str) -> str:
+	"""Format a tagged read (or anything with the same fields) as FASTQ record with the tags in the header"""
+	return f'{read.header}{format_tags(read)}\n{read.amplicon}\n+\n{qual}\n'
+
+
 PREDS = dict(
 	n_only_primer=lambda read: read.is_just_primer,
 	n_multiple_bcs=lambda read: read.has_multiple_barcodes,
@@ -96,27 +103,66 @@ def get_mismatches(barcode: str, *, max_mm: int = 1) -> Generator[str, None, Non
 				yield f'{barcode[:i]}{mismatch}{barcode[i+1:]}'
 
 
+def hamming_distances(barcodes: Sequence[str], *, chunk_size: int = 256) -> np.ndarray:
+	"""Pairwise Hamming distances of equal-length barcodes, computed in chunks of rows to limit memory"""
+	codes = np.frombuffer(''.join(barcodes).encode(), dtype=np.uint8).reshape(len(barcodes), -1)
+	distances = np.empty((len(barcodes), len(barcodes)), dtype=np.uint16)
+	for start in range(0, len(barcodes), chunk_size):
+		chunk = codes[start:start + chunk_size]
+		distances[start:start + chunk_size] = np.count_nonzero(chunk[:, None, :] != codes[None, :, :], axis=2)
+	return distances
+
+
+def get_close_pairs(barcodes: Iterable[str], max_dist: int) -> Generator[Tuple[str, str], None, None]:
+	"""Pairs of barcodes with a Hamming distance of at most ``max_dist``, in order of their occurrence"""
+	by_len: Dict[int, List[str]] = {}
+	for barcode in barcodes:
+		by_len.setdefault(len(barcode), []).append(barcode)
+	
+	pairs = []
+	order = {barcode: i for i, barcode in enumerate(b for bcs in by_len.values() for b in bcs)}
+	for bcs in by_len.values():
+		distances = hamming_distances(bcs)
+		for i, j in zip(*np.nonzero(np.triu(distances <= max_dist, k=1))):
+			pairs.append((bcs[i], bcs[j]))
+	yield from sorted(pairs, key=lambda pair: (order[pair[0]], order[pair[1]]))
+
+
 def get_all_barcodes(
 	barcodes: Iterable[str],
 	*,
-	max_mm: int = 1
+	max_mm: int = 1,
+	max_warnings: int = 10,
 ) -> Tuple[Dict[str, str], Dict[str, Set[Tuple[str, str]]]]:
-	found = {}
-	blacklist = {}
+	barcodes = list(barcodes)
+	found = {
+		pattern: barcode
+		for barcode in barcodes
+		for pattern in get_mismatches(barcode, max_mm=max_mm)
+	}
 	
-	for barcode in barcodes:
-		for pattern in get_mismatches(barcode, max_mm=max_mm):
-			previous_barcode = found.get(pattern)
-			if previous_barcode:
-				bl_item = blacklist.setdefault(pattern, set())
-				bl_item.add((previous_barcode, barcode))
-				bl_item.add((barcode, previous_barcode))
+	# Only barcodes with a distance of up to 2 × max_mm can share a pattern
+	blacklist = {}
+	mismatches: Dict[str, Set[str]] = {}
+	n_warnings = 0
+	for bc1, bc2 in get_close_pairs(barcodes, 2 * max_mm):
+		for bc in (bc1, bc2):
+			if bc not in mismatches:
+				mismatches[bc] = set(get_mismatches(bc, max_mm=max_mm))
+		shared = mismatches[bc1] & mismatches[bc2]
+		for pattern in sorted(shared):
+			bl_item = blacklist.setdefault(pattern, set())
+			bl_item.add((bc1, bc2))
+			bl_item.add((bc2, bc1))
+			if n_warnings < max_warnings:
 				warn(
 					'Barcodes with one mismatch are ambiguous: '
 					f'Modification {pattern} encountered in '
-					f'barcode {previous_barcode} and {barcode}'
+					f'barcode {bc1} and {bc2}'
 				)
-			found[pattern] = barcode
+			n_warnings += 1
+	if n_warnings > max_warnings:
+		warn(f'{n_warnings - max_warnings} more ambiguous modifications. See the barcode table (--bc-table).')
 	
 	for pattern in blacklist:
 		del found[pattern]
@@ -132,7 +178,11 @@ class ReadTagger:
 		len_primer: int,
 		*,
 		max_mm: int = 1,
-		use_stats: bool = True
+		use_stats: bool = True,
+		cache_size: int = 0,
+		search_window: Optional[float] = None,
+		search_margin: int = defaults.search_margin,
+		matcher: Optional[str] = None,
 	):
 		self.bc_to_id = bc_to_id
 		self.len_linker = len_linker
@@ -146,26 +196,86 @@ class ReadTagger:
 			n_junk=0,
 		)
 		
-		self.automaton = Automaton()
+		# LRU cache of barcode matches by read sequence, for highly duplicated libraries
+		self.cache_size = cache_size
+		self.cache: Optional[OrderedDict] = OrderedDict() if cache_size > 0 else None
+		self.cache_stats = None if self.cache is None else dict(n_hits=0, n_misses=0)
+		
+		# Only search the start of reads once it’s known where barcodes usually are
+		self.window = None if search_window is None else SearchWindow(
+			search_window, len_barcode=max(map(len, bc_to_id), default=0), margin=search_margin,
+		)
+		
 		all_barcodes, self.blacklist = get_all_barcodes(bc_to_id.keys(), max_mm=max_mm)
-		for pattern, barcode in all_barcodes.items():
-			self.automaton.add_word(pattern, barcode)
-		self.automaton.make_automaton()
+		self.matcher = get_matcher(all_barcodes, matcher)
+	
+	@property
+	def automaton(self) -> Matcher:
+		"""Alias of :attr:`matcher`, which used to always be an :class:`ahocorasick.Automaton`"""
+		return self.matcher
 	
-	def search_barcode(self, read: str) -> Tuple[int, int, str]:
-		for end, barcode in self.automaton.iter(read):
+	def search_barcode(self, read: str, window_end: Optional[int] = None) -> Tuple[int, int, str]:
+		"""Find barcodes ending before ``window_end`` (default: in the whole read)"""
+		for end, barcode in self.matcher.iter(read, window_end):
 			start = end - len(barcode) + 1
 			yield start, end + 1, barcode
 	
-	def tag_read(self, header: str, seq_read: str, seq_qual: str) -> TaggedRead:
+	def search_after_window(self, read: str, window_end: int) -> Tuple[int, int, str]:
+		"""Find barcodes ending at or after ``window_end``, i.e. the ones :meth:`search_barcode` leaves out"""
+		# Only barcodes overlapping the window end can start in it
+		offset = max(0, window_end - self.window.len_barcode + 1)
+		for start, end, barcode in self.search_barcode(read[offset:]):
+			if offset + end > window_end:
+				yield offset + start, offset + end, barcode
+	
+	def find_barcode(self, seq_read: str) -> Tuple[Optional[int], Optional[int], Optional[str], FrozenSet[str]]:
+		"""Find the first barcode and return its position, the barcode and the IDs of other barcodes"""
 		# as ordered set
-		matches = OrderedDict((match, None) for match in self.search_barcode(seq_read))
+		window = self.window
+		if window is None or window.end is None:
+			matches = OrderedDict((match, None) for match in self.search_barcode(seq_read))
+		else:
+			matches = OrderedDict((match, None) for match in self.search_barcode(seq_read, window.end))
+			if matches:
+				window.n_in_window += 1
+				# Barcodes after the window are still other barcodes, so the result is the same as without window
+				matches.update((match, None) for match in self.search_after_window(seq_read, window.end))
+			else:  # Fall back to the whole read
+				matches = OrderedDict((match, None) for match in self.search_barcode(seq_read))
+				window.n_fallback += 1
+				window.n_fallback_found += bool(matches)
 		
 		match_iter: Iterator[Tuple[int, int, str]] = iter(matches)
 		bc_start, bc_end, barcode = next(match_iter, (None, None, None))
 		
 		bc_id = self.bc_to_id.get(barcode)
 		other_barcodes = frozenset(set(self.bc_to_id[bc] for _, _, bc in match_iter) - {bc_id})
+		if window is not None and bc_start is not None:
+			window.add(bc_start)
+		return bc_start, bc_end, barcode, other_barcodes
+	
+	def match_read(self, seq_read: str) -> Tuple[Optional[int], Optional[int], Optional[str], FrozenSet[str]]:
+		"""Like :meth:`find_barcode`, but cached if a ``cache_size`` was specified"""
+		if self.cache is None:
+			return self.find_barcode(seq_read)
+		match = self.cache.get(seq_read)
+		if match is None:
+			self.cache_stats['n_misses'] += 1
+			match = self.cache[seq_read] = self.find_barcode(seq_read)
+			if len(self.cache) > self.cache_size:
+				self.cache.popitem(last=False)
+		else:
+			self.cache_stats['n_hits'] += 1
+			self.cache.move_to_end(seq_read)
+			# The window learns from every read, not only from distinct sequences
+			if self.window is not None and match[0] is not None:
+				self.window.add(match[0])
+		return match
+	
+	def tag_read(self, header: str, seq_read: str, seq_qual: str) -> TaggedRead:
+		"""Find the barcode of a read and split it into junk, barcode, linker and amplicon"""
+		bc_start, bc_end, barcode, other_barcodes = self.match_read(seq_read)
+		bc_id = self.bc_to_id.get(barcode)
 		
 		if barcode is not None:
 			linker_end = bc_end + self.len_linker if bc_end else None
@@ -192,7 +302,27 @@ class ReadTagger:
 		
 		return read
 	
-	def get_barcode_table(self, plain=False):
+	def get_conflict_table(self) -> pd.DataFrame:
+		"""Table of barcode pairs sharing patterns with one mismatch"""
+		id_of = self.bc_to_id
+		shared: Dict[Tuple[str, str], List[str]] = {}
+		for pattern, bc_pairs in self.blacklist.items():
+			for bc1, bc2 in bc_pairs:
+				if id_of[bc1] < id_of[bc2]:
+					shared.setdefault((bc1, bc2), []).append(pattern)
+		return pd.DataFrame(
+			[
+				(id_of[bc1], bc1, id_of[bc2], bc2, sum(a != b for a, b in zip(bc1, bc2)), ','.join(sorted(patterns)))
+				for (bc1, bc2), patterns in sorted(shared.items(), key=lambda item: (id_of[item[0][0]], id_of[item[0][1]]))
+			],
+			columns=['id_1', 'barcode_1', 'id_2', 'barcode_2', 'distance', 'patterns'],
+		)
+	
+	def get_barcode_table(self, plain=False, *, max_matrix_size: int = 100):
+		"""
+		HTML table of ambiguous barcodes.
+		A barcode × barcode matrix if at most ``max_matrix_size`` barcodes are involved, else a list of pairs.
+		"""
 		cell_templates = {
 			(True, True): '{}',
 			(True, False): '<span class="b">{}</span>',
@@ -200,17 +330,31 @@ class ReadTagger:
 			(False, False): '<span class="both">{}</span>',
 		}
 		
-		patterns = sorted({bc for bc_pairs in self.blacklist.values() for pair in bc_pairs for bc in pair})
-		sprs = pd.DataFrame(index=patterns, columns=patterns, dtype=str)
-		for pattern, bc_pairs in self.blacklist.items():
-			for bc1, bc2 in bc_pairs:
-				sprs.loc[bc1, bc2] = ''.join(
-					cell_templates[bc1[i] == base, bc2[i] == base].format(base)
-					for i, base in enumerate(pattern)
-				)
+		def render(bc1: str, bc2: str, patterns: str) -> str:
+			return '<br>'.join(
+				''.join(cell_templates[bc1[i] == base, bc2[i] == base].format(base) for i, base in enumerate(pattern))
+				for pattern in patterns.split(',')
+			)
+		
+		conflicts = self.get_conflict_table()
+		barcodes = sorted(set(conflicts.barcode_1) | set(conflicts.barcode_2))
+		if len(barcodes) > max_matrix_size:
+			table = conflicts.assign(patterns=[
+				render(bc1, bc2, patterns) for bc1, bc2, patterns
+				in zip(conflicts.barcode_1, conflicts.barcode_2, conflicts.patterns)
+			])
+			table_kw = dict(index=False)
+		else:
+			# Build all cells at once instead of assigning them to a DataFrame one by one
+			cells: Dict[str, Dict[str, str]] = {}
+			for bc1, bc2, patterns in zip(conflicts.barcode_1, conflicts.barcode_2, conflicts.patterns):
+				cells.setdefault(bc1, {})[bc2] = render(bc1, bc2, patterns)
+				cells.setdefault(bc2, {})[bc1] = render(bc2, bc1, patterns)
+			table = pd.DataFrame.from_dict(cells, orient='index', dtype=str).reindex(index=barcodes, columns=barcodes)
+			table_kw = {}
 		
-		with pd.option_context('display.max_colwidth', -1):
-			html = sprs.to_html(escape=False, na_rep='')
+		with pd.option_context('display.max_colwidth', None):
+			html = table.to_html(escape=False, na_rep='', **table_kw)
 		
 		if plain:
 			return html
@@ -221,6 +365,14 @@ def get_tagger(
 	id_to_bc: Iterable[Tuple[str, str]],
 	len_linker: int = defaults.len_linker,
 	len_primer: int = defaults.len_primer,
+	*,
+	cache_size: int = defaults.cache_size,
+	search_window: Optional[float] = None,
+	search_margin: int = defaults.search_margin,
+	matcher: Optional[str] = None,
 ):
 	bc_to_id = {bc: id_ for id_, bc in id_to_bc}
-	return ReadTagger(bc_to_id, len_linker, len_primer)
+	return ReadTagger(
+		bc_to_id, len_linker, len_primer,
+		cache_size=cache_size, search_window=search_window, search_margin=search_margin, matcher=matcher,
+	)
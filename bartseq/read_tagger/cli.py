@@ -1,10 +1,43 @@
-from argparse import ArgumentParser, Action, Namespace, ArgumentError
+from argparse import ArgumentParser, Action, Namespace, ArgumentError, ArgumentTypeError
+from pathlib import Path
+from typing import Union
 
 from . import defaults
-from ..io import openers
+from .monitor import AbortRule, TaggingAborted
+from ..bts import SUFFIX as BTS_SUFFIX
+from ..io import openers, compressors
 from ..cli_helpers import CLI, t_in_file, t_out_file
 
 
+def t_sample(s: str) -> Union[float, int]:
+	try:
+		sample = float(s)
+	except ValueError:
+		sample = -1
+	if 0 < sample < 1:
+		return sample
+	if sample >= 1 and sample.is_integer():
+		return int(sample)
+	raise ArgumentTypeError(f'Invalid sample {s!r}, needs to be a fraction between 0 and 1 or a number of reads')
+
+
+def t_quantile(s: str) -> float:
+	try:
+		quantile = float(s)
+	except ValueError:
+		quantile = -1
+	if 0 < quantile <= 1:
+		return quantile
+	raise ArgumentTypeError(f'Invalid quantile {s!r}, needs to be a fraction like “0.999”')
+
+
+def t_abort_rule(s: str) -> AbortRule:
+	try:
+		return AbortRule.parse(s)
+	except ValueError as e:
+		raise ArgumentTypeError(str(e))
+
+
 class ReadTaggerCLI(CLI):
 	@staticmethod
 	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
@@ -28,7 +61,13 @@ class ReadTaggerCLI(CLI):
 			help='File to write final stats to (in JSON format)')
 		parser.add_argument(
 			'--bc-table', '-B', nargs='?',
-			help='File name for the HTML table of barcode mismatches')
+			help='File name for the HTML table of barcode mismatches. Writes a TSV of conflicts if it ends with “.tsv”')
+		parser.add_argument(
+			'--index-file', '-x', nargs='?',
+			help='File to write a block index of the output reads to (in JSON format). Enables filtering in “browse”')
+		parser.add_argument(
+			'--index-block-size', type=int, default=defaults.index_block_size,
+			help='Number of records per independently compressed block if --index-file is specified')
 		parser.add_argument(
 			'--total', '-t', type=int, default=defaults.total,
 			help='Number of fastq records in file. “0” means no progressbar')
@@ -38,12 +77,53 @@ class ReadTaggerCLI(CLI):
 		parser.add_argument(
 			'--len-linker', '-l', type=int, default=defaults.len_linker,
 			help='Linker length to cut out')
+		parser.add_argument(
+			'--cache-size', '-c', type=int, default=defaults.cache_size,
+			help=(
+				'Number of distinct read sequences to remember barcode matches for (LRU). '
+				'Each entry takes about as much memory as the read sequence plus ~300 bytes. “0” disables the cache'))
+		parser.add_argument(
+			'--search-window', '-w', type=t_quantile, metavar='QUANTILE', help=(
+				f'Learn where barcodes start from the first {defaults.search_warmup} barcodes, '
+				'then first search reads up to this quantile of barcode starts (e.g. “0.999”) plus barcode length and margin. '
+				'Reads without barcode there are searched completely, the rest of the others for other barcodes, '
+				'so the output is the same as without window'))
+		parser.add_argument(
+			'--search-margin', type=int, default=defaults.search_margin,
+			help='Number of bases to add to the learned --search-window')
+		parser.add_argument(
+			'--sample', '-S', type=t_sample, metavar='FRACTION|N', help=(
+				'Only tag a random sample of read (pairs): A fraction like “0.001” or a number like “100000”. '
+				'The stats file then contains 95%% confidence intervals for the fraction of reads in each category'))
+		parser.add_argument(
+			'--seed', type=int,
+			help='Random seed for --sample')
+		parser.add_argument(
+			'--snapshot-interval', type=float, default=defaults.snapshot_interval, metavar='SECONDS',
+			help='Seconds between stats snapshots in “<stats-file stem>.partial.json”. “0” disables them')
+		parser.add_argument(
+			'--abort-if', type=t_abort_rule, action='append', default=[], metavar='RULE', help=(
+				'Stop with an error if the fraction of reads in a stats category crosses a threshold '
+				'after a number of reads, e.g. “n_regular<0.2@5000000” or “read2.n_junk>0.5@1000000”. '
+				'Can be specified multiple times'))
+		parser.add_argument(
+			'--bin-qual', action='store_true',
+			help='Bin quality scores into 8 levels when writing .bts files (lossy, but compresses much better)')
 		parser.add_argument(
 			'--in-compression', '-i', choices=openers.keys(),
 			help='Specify compression if reading from stdin or a file with unusual suffix')
 		parser.add_argument(
-			'--out-compression', '-o', choices=openers.keys(),
-			help='Specify compression if writing to stdout or a file with unusual suffix')
+			'--out-compression', '-o', choices=[*openers.keys(), BTS_SUFFIX[1:]],
+			help=(
+				'Specify compression if writing to stdout or a file with unusual suffix. '
+				'“bts” (or the file suffix “.bts”) writes a compact binary format instead of FASTQ. '
+				'“zst” and “lz4” are much faster than “gz” and need the zstandard or lz4 package'))
+		parser.add_argument(
+			'--out-level', type=int,
+			help='Compression level, e.g. 1–9 for gz, 1–19 for zst. Default: The compression’s default')
+		parser.add_argument(
+			'--out-threads', type=int,
+			help='Number of compression threads for zst output. “-1” uses all cores')
 		parser.add_argument(
 			'--dry-run', '-n', action='store_true',
 			help='Only print what would be done and exit')
@@ -62,13 +142,28 @@ class ReadTaggerCLI(CLI):
 		
 		if bool(args.in_2) != bool(args.out_2):
 			raise ArgumentError(find_action('in_2'), 'You need to specify both or none of --in-2 and --out-2.')
+		
+		for out in [args.out_1, args.out_2]:
+			if out is None:
+				continue
+			compression = args.out_compression or (Path(out).suffix[1:] if isinstance(out, str) else None)
+			if args.out_threads is not None and compression != 'zst':
+				raise ArgumentError(find_action('out_threads'), 'Only zst output can be compressed with multiple threads.')
+			if args.index_file:
+				if compression not in compressors and compression != BTS_SUFFIX[1:]:
+					raise ArgumentError(find_action('index_file'), (
+						f'Indexed output needs to be compressed with one of {", ".join(compressors)} or be .bts. '
+						'Specify --out-compression if writing to stdout or a file with unusual suffix.'))
 	
 	@staticmethod
 	def run(parser: ArgumentParser, args: Namespace):
 		from .main import run
 		kwargs = vars(args)
 		del kwargs['func']
-		run(**kwargs)
+		try:
+			run(**kwargs)
+		except TaggingAborted as e:
+			parser.exit(3, f'{e}\n')
 
 
 cli = ReadTaggerCLI()
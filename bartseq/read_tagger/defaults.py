@@ -1,3 +1,8 @@
 total = 0
 len_primer = 27
 len_linker = 10
+index_block_size = 10000
+cache_size = 0
+snapshot_interval = 60
+search_margin = 2
+search_warmup = 10000
@@ -1,16 +1,30 @@
 import json
 from pathlib import Path
-from typing import Union, Optional, Iterable
+from typing import Union, Optional, Iterable, Sequence, TextIO
 
-from bartseq.read_tagger import HTML_INTRO
+import pandas as pd
+
+from bartseq.read_tagger import HTML_INTRO, ReadTagger, TaggedRead
+from ..bts import BtsWriter
 from ..io import read_fasta, transparent_open
 
 
 def write_bc_tables(paths_bc_files: Iterable[Union[Path, str]], path_bc_table: Union[Path, str]):
-	"""This is mainly independent of the rest, so do simple duplicate work to be able to create this separately"""
+	"""
+	This is mainly independent of the rest, so do simple duplicate work to be able to create this separately.
+	Writes a TSV of conflicting barcode pairs if ``path_bc_table`` ends with “.tsv”, else HTML.
+	"""
 	from . import get_tagger
 	Path(path_bc_table).parent.mkdir(parents=True, exist_ok=True)
 	with transparent_open(path_bc_table, 'wt') as f_bc:
+		if Path(path_bc_table).suffix == '.tsv':
+			pd.concat([
+				get_tagger(read_fasta(path_bc_file)).get_conflict_table()
+					.assign(barcode_file=Path(path_bc_file).with_suffix('').name)
+				for path_bc_file in paths_bc_files
+			]).to_csv(f_bc, sep='\t', index=False)
+			return
+		
 		f_bc.write(HTML_INTRO)
 		for path_bc_file in paths_bc_files:
 			tagger = get_tagger(read_fasta(path_bc_file))
@@ -19,17 +33,63 @@ def write_bc_tables(paths_bc_files: Iterable[Union[Path, str]], path_bc_table: U
 			f_bc.write(tagger.get_barcode_table(plain=True))
 
 
+def write_tagged(f: Union[TextIO, BtsWriter], read: TaggedRead):
+	"""Write a read to a .bts writer, or as FASTQ to a text file"""
+	f.write(read if isinstance(f, BtsWriter) else str(read))
+
+
+class TaggedReadWriter:
+	"""Writes tagged reads (one per output file) as FASTQ or .bts"""
+	def __init__(self, files: Sequence[Union[TextIO, BtsWriter]]):
+		self.files = files
+	
+	def write(self, *reads):
+		for f, read in zip(self.files, reads):
+			write_tagged(f, read)
+	
+	def close(self):
+		pass
+
+
 def write_stats(
 	stats_file: Union[Path, str],
 	n_reads: int,
 	n_both_regular: Optional[int],
 	stats1: dict,
 	stats2: Optional[dict] = None,
+	**extra: Optional[dict],
 ):
+	"""Write stats as JSON. ``extra`` are additional sections (e.g. ``cache``) that are skipped if ``None``"""
 	with transparent_open(stats_file, 'wt') as f_s:
 		stats = dict(n_reads=n_reads, read1=stats1)
 		if n_both_regular is not None:
 			stats['n_both_regular'] = n_both_regular
 		if stats2:
 			stats['read2'] = stats2
+		stats.update((k, v) for k, v in extra.items() if v is not None)
 		json.dump(stats, f_s, indent='\t')
+
+
+def get_cache_stats(*taggers: Optional[ReadTagger]) -> Optional[dict]:
+	"""Cache hits and misses per read, or None if the taggers don’t cache"""
+	if not any(tagger and tagger.cache_stats for tagger in taggers):
+		return None
+	cache_stats = {}
+	for r, tagger in enumerate(taggers, 1):
+		if tagger is None:
+			continue
+		n_hits, n_misses = tagger.cache_stats['n_hits'], tagger.cache_stats['n_misses']
+		cache_stats[f'read{r}'] = dict(
+			size=tagger.cache_size,
+			n_hits=n_hits,
+			n_misses=n_misses,
+			hit_rate=n_hits / (n_hits + n_misses) if n_hits + n_misses else 0.,
+		)
+	return cache_stats
+
+
+def get_window_stats(*taggers: Optional[ReadTagger]) -> Optional[dict]:
+	"""Learned search window, fallbacks and barcode start histogram per read, or None if no window is used"""
+	if not any(tagger and tagger.window for tagger in taggers):
+		return None
+	return {f'read{r}': tagger.window.get_stats() for r, tagger in enumerate(taggers, 1) if tagger is not None}
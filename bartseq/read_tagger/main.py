@@ -1,29 +1,62 @@
 from contextlib import contextmanager
-from typing import Generator, Union, Iterable, Optional
+from pathlib import Path
+from typing import Generator, Union, Iterable, Optional, Sequence, Tuple, List
 
 from tqdm import tqdm
 
 from . import defaults, ReadTagger, get_tagger
-from .io import write_bc_tables, write_stats
-from ..io import transparent_open, iter_fq, read_fasta
+from .io import write_bc_tables, write_stats, get_cache_stats, get_window_stats, TaggedReadWriter
+from .monitor import AbortRule, StatsMonitor, partial_stats_path
+from .sampling import Sampler, get_sample_stats
+from ..bts import BtsWriter, is_bts
+from ..index import ReadIndexer
+from ..io import transparent_open, iter_fq, read_fasta, BlockWriter, FastqSkipper
 from ..logging import init_logging
 
 
+def read_barcodes(
+	bc_file: Union[Path, str],
+	linker_file: Optional[Union[Path, str]] = None,
+	len_linker: int = defaults.len_linker,
+) -> Tuple[List[Tuple[str, str]], int]:
+	"""Barcode IDs and sequences, and the linker length to use with them"""
+	bcs_all = list(read_fasta(bc_file))
+	if linker_file:  # If a linker file is passed, we match the full thing
+		linkers = dict(read_fasta(linker_file))
+		bcs_l = [(h, bc+linkers['Left' ]) for h, bc in bcs_all if h[0] == 'L']
+		bcs_r = [(h, bc+linkers['Right']) for h, bc in bcs_all if h[0] == 'R']
+		bcs_all = bcs_l + bcs_r
+		len_linker = 0
+	return bcs_all, len_linker
+
+
 def run(
 	in_1: Union[str, Iterable[str]],
 	out_1: Union[str, Iterable[str]],
 	*,
 	in_2: Union[str, Iterable[str]],
 	out_2: Union[str, Iterable[str]],
-	linker_file: Optional[str],
+	linker_file: Optional[str] = None,
 	bc_file: str,
 	stats_file: str,
 	bc_table: Optional[str] = None,
+	index_file: Optional[str] = None,
+	index_block_size: int = defaults.index_block_size,
 	total: int = defaults.total,
 	len_primer: int = defaults.len_primer,
 	len_linker: int = defaults.len_linker,
+	cache_size: int = defaults.cache_size,
+	search_window: Optional[float] = None,
+	search_margin: int = defaults.search_margin,
+	bin_qual: bool = False,
+	sample: Union[float, int, None] = None,
+	seed: Optional[int] = None,
+	snapshot_interval: float = defaults.snapshot_interval,
+	abort_if: Sequence[AbortRule] = (),
 	in_compression: Optional[str] = None,
 	out_compression: Optional[str] = None,
+	out_level: Optional[int] = None,
+	out_threads: Optional[int] = None,
 	dry_run=False,
 	log_init=True
 ):
@@ -32,75 +65,126 @@ def run(
 	if dry_run:
 		if bc_table:
 			print('Would write bc table to', bc_table)
+		if sample is not None:
+			print('Would sample', f'{sample:.2%} of the' if sample < 1 else f'{sample}', 'reads')
 		print('Would write', 'two read files:' if has_two_reads else 'one read file:')
 		print('\tWould read from', in_1, f'and {in_2}' if has_two_reads else '')
 		print('\tWould write to', out_1, f'and {out_2}' if has_two_reads else '')
 		print('Would write stats to', stats_file)
+		if snapshot_interval:
+			print(f'Would write stats snapshots every {snapshot_interval}s to', partial_stats_path(stats_file))
+		for rule in abort_if:
+			print('Would abort if', rule)
+		if index_file:
+			print('Would write index to', index_file)
+		ins = [in_1, in_2] if has_two_reads else [in_1]
+		if all(isinstance(in_, (str, Path)) and Path(in_).is_file() for in_ in ins):
+			from ..estimate import measure_library
+			est = measure_library(ins, bc_file, linker_file)
+			print(f'Would tag about {est.n_reads} reads, {est.rate_regular:.1%} of the first ones have barcodes')
+			if est.tag_rate:
+				print(f'Would take about {est.n_reads / est.tag_rate:.0f}s (see “bartseq estimate” for the other steps)')
 		return
 	
 	if log_init:
 		init_logging()
 	
-	bcs_all = list(read_fasta(bc_file))
-	if linker_file:  # If a linker file is passed, we match the full thing
-		linkers = dict(read_fasta(linker_file))
-		bcs_l = [(h, bc+linkers['Left' ]) for h, bc in bcs_all if h[0] == 'L']
-		bcs_r = [(h, bc+linkers['Right']) for h, bc in bcs_all if h[0] == 'R']
-		bcs_all = bcs_l + bcs_r
-		len_linker = 0
+	bcs_all, len_linker = read_barcodes(bc_file, linker_file, len_linker)
 	
 	if bc_table:
 		write_bc_tables([bc_file], bc_table)
 	
 	# Two taggers to get two sets of statistics
-	tagger1 = get_tagger(bcs_all, len_linker, len_primer)
-	tagger2 = get_tagger(bcs_all, len_linker, len_primer) if has_two_reads else None
+	tagger_kw = dict(cache_size=cache_size, search_window=search_window, search_margin=search_margin)
+	tagger1 = get_tagger(bcs_all, len_linker, len_primer, **tagger_kw)
+	tagger2 = get_tagger(bcs_all, len_linker, len_primer, **tagger_kw) if has_two_reads else None
+	monitor = StatsMonitor(
+		partial_stats_path(stats_file), [tagger1, tagger2], interval=snapshot_interval, abort_rules=abort_if,
+	)
+	
+	def open_out(out: Union[str, Iterable[str]]):
+		if is_bts(out, out_compression):  # Blocks are written by the indexer or every index_block_size reads
+			return BtsWriter(
+				out, [h for h, _ in bcs_all], len_primer=len_primer, bin_qual=bin_qual,
+				block_size=None if index_file else index_block_size, ensure_parentdir=True,
+				**({} if out_level is None else dict(level=out_level)),
+			)
+		if index_file:  # Write independently compressed blocks to be able to seek to them
+			return BlockWriter(
+				out, out_compression or Path(out).suffix[1:], ensure_parentdir=True, level=out_level, threads=out_threads,
+			)
+		return transparent_open(
+			out, 'wt', ensure_parentdir=True, suffix=out_compression, level=out_level, threads=out_threads,
+		)
+	
+	# Sampling reads binary to be able to skip records without decoding them
+	in_mode = 'rt' if sample is None else 'rb'
+	if sample is not None:
+		total = 0 if total == 0 else None  # We don’t know how many reads will be sampled
 	
 	with tqdm(total=total) if total != 0 else ctx_dummy() as pb, \
-			transparent_open(in_1, 'rt', suffix=in_compression) as f_in_1, \
-			transparent_open(out_1, 'wt', suffix=out_compression, ensure_parentdir=True) as f_out_1, \
-			transparent_open(in_2, 'rt', suffix=in_compression) \
+			transparent_open(in_1, in_mode, suffix=in_compression) as f_in_1, \
+			open_out(out_1) as f_out_1, \
+			transparent_open(in_2, in_mode, suffix=in_compression) \
 				if has_two_reads else ctx_dummy() as f_in_2, \
-			transparent_open(out_2, 'wt', suffix=out_compression, ensure_parentdir=True) \
-				if has_two_reads else ctx_dummy() as f_out_2:
+			open_out(out_2) if has_two_reads else ctx_dummy() as f_out_2:
+		
+		ins = [f_in_1, f_in_2] if has_two_reads else [f_in_1]
+		outs = [f_out_1, f_out_2] if has_two_reads else [f_out_1]
+		writer = ReadIndexer(outs, index_file, index_block_size) if index_file else TaggedReadWriter(outs)
+		
+		if sample is None:
+			sampler = None
+			records = zip(*map(iter_fq, ins))
+		else:
+			sampler = records = Sampler([FastqSkipper(f) for f in ins], sample, seed=seed)
 		
 		n_reads = 0
 		n_both_regular = 0
 		if has_two_reads:
-			for r, (parts1, parts2) in enumerate(zip(iter_fq(f_in_1), iter_fq(f_in_2))):
+			for r, (parts1, parts2) in enumerate(records):
 				read1 = tagger1.tag_read(*parts1)
 				read2 = tagger2.tag_read(*parts2)
 				
 				try:
 					if read1.is_regular and read2.is_regular:
 						n_both_regular += 1
-						f_out_1.write(str(read1))
-						f_out_2.write(str(read2))
+						writer.write(read1, read2)
 				except BrokenPipeError:
 					break
 				
 				update_pb(pb, tagger1, r)
-				n_reads = r
+				n_reads = r + 1
+				monitor.update(n_reads, n_both_regular)
 		# TODO: maybe both?
 		else:
-			for r, (header, seq_read, seq_qual) in enumerate(iter_fq(f_in_1)):
-				read = tagger1.tag_read(header, seq_read, seq_qual)
+			for r, (parts,) in enumerate(records):
+				read = tagger1.tag_read(*parts)
 				
 				try:
-					f_out_1.write(str(read))
+					writer.write(read)
 				except BrokenPipeError:
 					break
 				
 				update_pb(pb, tagger1, r)
-				n_reads = r
+				n_reads = r + 1
+				monitor.update(n_reads)
 		
+		writer.close()
 		if pb:
 			pb.close()
 	
 	write_stats(
 		stats_file, n_reads, n_both_regular if has_two_reads else None,
 		tagger1.stats, tagger2.stats if has_two_reads else None,
+		cache=get_cache_stats(tagger1, tagger2),
+		search_window=get_window_stats(tagger1, tagger2),
+		sample=get_sample_stats(
+			sampler, n_reads, n_both_regular if has_two_reads else None,
+			tagger1.stats, tagger2.stats if has_two_reads else None, seed=seed,
+		) if sampler else None,
 	)
+	monitor.close()
 
 
 def update_pb(pb: Optional[tqdm], tgr: ReadTagger, i: int):
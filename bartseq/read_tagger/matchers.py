@@ -0,0 +1,115 @@
+"""
+Backends for finding barcode patterns in reads.
+
+The Aho-Corasick backend uses the ``pyahocorasick`` C extension, which is fastest on CPython.
+On PyPy, C extensions run through the slow ``cpyext`` layer, so the pure Python k-mer backend is used there.
+"""
+import platform
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Tuple, Optional, Iterable, Type
+
+try:
+	from ahocorasick import Automaton
+except ImportError:  # pragma: no cover
+	Automaton = None
+
+
+class Matcher(ABC):
+	"""
+	Finds patterns in reads. Maps each pattern to a value (the barcode).
+	
+	:meth:`iter` yields ``(end, value)`` with the inclusive end index of each match, ordered by end,
+	with longer patterns first for matches with the same end (like :meth:`ahocorasick.Automaton.iter`).
+	"""
+	name: str
+	
+	@abstractmethod
+	def __init__(self, patterns: Dict[str, str]):
+		pass
+	
+	@abstractmethod
+	def iter(self, read: str, window_end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+		"""Find all patterns ending before ``window_end`` (default: in the whole read)"""
+	
+	@abstractmethod
+	def keys(self) -> Iterable[str]:
+		pass
+	
+	@abstractmethod
+	def values(self) -> Iterable[str]:
+		pass
+
+
+class AhoCorasickMatcher(Matcher):
+	name = 'aho-corasick'
+	
+	def __init__(self, patterns: Dict[str, str]):
+		if Automaton is None:
+			raise ImportError('The aho-corasick matcher needs the pyahocorasick package')
+		self.automaton = Automaton()
+		for pattern, value in patterns.items():
+			self.automaton.add_word(pattern, value)
+		self.automaton.make_automaton()
+	
+	def iter(self, read: str, window_end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+		if window_end is None:
+			return self.automaton.iter(read)
+		return self.automaton.iter(read, 0, window_end)
+	
+	def keys(self) -> Iterable[str]:
+		return self.automaton.keys()
+	
+	def values(self) -> Iterable[str]:
+		return self.automaton.values()
+
+
+class KmerMatcher(Matcher):
+	"""Looks up every substring with the length of a pattern in a dict. Simple loops like this are fast with PyPy’s JIT"""
+	name = 'kmer'
+	
+	def __init__(self, patterns: Dict[str, str]):
+		self.patterns = dict(patterns)
+		self.lengths = sorted({len(pattern) for pattern in self.patterns}, reverse=True)
+	
+	def iter(self, read: str, window_end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+		patterns = self.patterns
+		end = len(read) if window_end is None else min(window_end, len(read))
+		if len(self.lengths) == 1:  # All barcodes usually have the same length
+			k = self.lengths[0]
+			for start in range(end - k + 1):
+				value = patterns.get(read[start:start + k])
+				if value is not None:
+					yield start + k - 1, value
+			return
+		
+		for match_end in range(self.lengths[-1], end + 1) if self.lengths else ():
+			for k in self.lengths:
+				if k > match_end:
+					continue
+				value = patterns.get(read[match_end - k:match_end])
+				if value is not None:
+					yield match_end - 1, value
+	
+	def keys(self) -> Iterable[str]:
+		return self.patterns.keys()
+	
+	def values(self) -> Iterable[str]:
+		return self.patterns.values()
+
+
+MATCHERS: Dict[str, Type[Matcher]] = {m.name: m for m in [AhoCorasickMatcher, KmerMatcher]}
+
+
+def default_matcher() -> str:
+	"""Aho-Corasick on CPython if pyahocorasick is installed, else the k-mer matcher"""
+	if Automaton is None or platform.python_implementation() == 'PyPy':
+		return KmerMatcher.name
+	return AhoCorasickMatcher.name
+
+
+def get_matcher(patterns: Dict[str, str], name: Optional[str] = None) -> Matcher:
+	"""
+	:param patterns: Mapping from patterns to values (e.g. barcodes with mismatches to barcodes)
+	:param name: One of :data:`MATCHERS`. Default: :func:`default_matcher`
+	"""
+	return MATCHERS[name or default_matcher()](patterns)
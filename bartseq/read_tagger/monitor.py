@@ -0,0 +1,133 @@
+"""Live stats snapshots and early abort of tagging runs that look like failed libraries"""
+import re
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence, Union, Dict
+
+from . import ReadTagger, PREDS
+from ..io import write_json_atomic
+
+
+RE_ABORT_RULE = re.compile(
+	r'(?:(?P<read>read[12])\.)?(?P<name>\w+)(?P<op>[<>])(?P<threshold>[\d.]+(?:e-?\d+)?)(?:@(?P<min_reads>\d+))?'
+)
+
+
+class AbortRule(NamedTuple):
+	"""Abort if the fraction of reads in a category is below/above a threshold after ``min_reads`` reads"""
+	read: Optional[str]  # read1 or read2; None for n_both_regular and for PREDS categories in read1
+	name: str
+	op: str
+	threshold: float
+	min_reads: int
+	
+	@classmethod
+	def parse(cls, rule: str) -> 'AbortRule':
+		"""Parse rules like ``n_regular<0.2@5000000`` or ``read2.n_junk>0.5``"""
+		match = RE_ABORT_RULE.fullmatch(rule.replace(' ', ''))
+		if not match:
+			raise ValueError(f'Invalid abort rule {rule!r}, needs to look like “n_regular<0.2@5000000”')
+		if match['name'] not in PREDS and match['name'] != 'n_both_regular':
+			raise ValueError(f'Unknown stat {match["name"]!r} in abort rule, use one of {", ".join(PREDS)}, n_both_regular')
+		return cls(match['read'], match['name'], match['op'], float(match['threshold']), int(match['min_reads'] or 0))
+	
+	def __str__(self):
+		read = f'{self.read}.' if self.read else ''
+		return f'{read}{self.name}{self.op}{self.threshold}@{self.min_reads}'
+	
+	def is_violated(self, rates: dict) -> bool:
+		if self.name == 'n_both_regular':
+			rate = rates.get('n_both_regular')
+		else:
+			rate = rates.get(self.read or 'read1', {}).get(self.name)
+		if rate is None:
+			return False
+		return rate < self.threshold if self.op == '<' else rate > self.threshold
+
+
+class TaggingAborted(Exception):
+	def __init__(self, rule: AbortRule, snapshot: dict):
+		super().__init__(f'Aborted tagging after {snapshot["n_reads"]} reads because of rule {rule}')
+		self.rule = rule
+		self.snapshot = snapshot
+
+
+def partial_stats_path(stats_file: Union[Path, str]) -> Path:
+	"""E.g. ``Lib1_stats.json`` → ``Lib1_stats.partial.json``"""
+	path = Path(stats_file)
+	return path.with_name(f'{path.stem}.partial{path.suffix}')
+
+
+class StatsMonitor:
+	"""
+	Periodically writes a stats snapshot and checks abort rules while tagging.
+	
+	:meth:`update` is cheap enough to call for every read, it only acts every ``check_every`` reads.
+	"""
+	def __init__(
+		self,
+		path: Path,
+		taggers: Sequence[Optional[ReadTagger]],
+		*,
+		interval: float,
+		abort_rules: Sequence[AbortRule] = (),
+		check_every: int = 1000,
+	):
+		"""
+		:param path: Where to write snapshots to
+		:param taggers: The taggers for read1 and read2 (``None`` for single reads)
+		:param interval: Seconds between snapshots. ``0`` disables them (abort rules are still checked)
+		:param abort_rules: Raise :class:`TaggingAborted` if one of these is violated
+		:param check_every: Number of reads between checks
+		"""
+		self.path = path
+		self.taggers = taggers
+		self.interval = interval
+		self.abort_rules = abort_rules
+		self.check_every = check_every
+		self.start = self.last_snapshot = time.monotonic()
+	
+	def get_snapshot(self, n_reads: int, n_both_regular: Optional[int]) -> dict:
+		elapsed = time.monotonic() - self.start
+		snapshot = dict(
+			n_reads=n_reads,
+			elapsed=elapsed,
+			reads_per_sec=n_reads / elapsed if elapsed else 0.,
+			updated=time.time(),
+		)
+		rates: Dict[str, Union[float, Dict[str, float]]] = {}
+		if n_both_regular is not None:
+			snapshot['n_both_regular'] = n_both_regular
+			rates['n_both_regular'] = n_both_regular / n_reads if n_reads else 0.
+		for r, tagger in enumerate(self.taggers, 1):
+			if tagger is None or tagger.stats is None:
+				continue
+			snapshot[f'read{r}'] = dict(tagger.stats)
+			rates[f'read{r}'] = {name: count / n_reads if n_reads else 0. for name, count in tagger.stats.items()}
+		snapshot['rates'] = rates
+		return snapshot
+	
+	def update(self, n_reads: int, n_both_regular: Optional[int] = None):
+		if n_reads % self.check_every != 0:
+			return
+		
+		snapshot = None
+		for rule in self.abort_rules:
+			if n_reads < rule.min_reads:
+				continue
+			snapshot = snapshot or self.get_snapshot(n_reads, n_both_regular)
+			if rule.is_violated(snapshot['rates']):
+				snapshot['aborted'] = str(rule)
+				write_json_atomic(self.path, snapshot)
+				raise TaggingAborted(rule, snapshot)
+		
+		if self.interval and time.monotonic() - self.last_snapshot >= self.interval:
+			write_json_atomic(self.path, snapshot or self.get_snapshot(n_reads, n_both_regular))
+			self.last_snapshot = time.monotonic()
+	
+	def close(self):
+		"""Remove the snapshot after a successful run, as the final stats are written now. Also removes stale ones"""
+		try:
+			self.path.unlink()
+		except FileNotFoundError:
+			pass
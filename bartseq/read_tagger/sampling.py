@@ -0,0 +1,110 @@
+"""Random subsampling of (paired) FASTQ records for quick previews of a library"""
+import math
+import random
+from typing import Union, Optional, Sequence, Tuple, List, Generator, Dict
+
+from ..io import FastqSkipper
+
+
+Record = Tuple[str, str, str]
+
+
+class Sampler:
+	"""
+	Samples records in lockstep from one or more FASTQ files, so read pairs stay together.
+	
+	A ``sample`` below 1 is the fraction of records to take (Bernoulli sampling).
+	Otherwise it’s the number of records to take uniformly (reservoir sampling, Li’s “Algorithm L”).
+	Either way, the number of records to skip is drawn up front, so skipped records are never parsed.
+	"""
+	def __init__(self, readers: Sequence[FastqSkipper], sample: Union[float, int], *, seed: Optional[int] = None):
+		self.readers = readers
+		self.sample = sample
+		self.rng = random.Random(seed)
+		self.n_scanned = 0  # Number of records read or skipped, i.e. the total number after sampling
+	
+	def skip(self, n: int) -> bool:
+		skipped = [reader.skip(n) for reader in self.readers]
+		self.n_scanned += skipped[0]
+		if len(set(skipped)) > 1:
+			raise IOError('Read files have different numbers of records')
+		return skipped[0] == n
+	
+	def read(self) -> Optional[Tuple[Record, ...]]:
+		records = tuple(reader.read() for reader in self.readers)
+		if records[0] is None:
+			if any(records):
+				raise IOError('Read files have different numbers of records')
+			return None
+		self.n_scanned += 1
+		return records
+	
+	def __iter__(self) -> Generator[Tuple[Record, ...], None, None]:
+		if self.sample < 1:
+			yield from self.iter_fraction(self.sample)
+		else:
+			yield from self.iter_reservoir(int(self.sample))
+	
+	def iter_fraction(self, fraction: float) -> Generator[Tuple[Record, ...], None, None]:
+		log_q = math.log1p(-fraction)
+		while True:
+			# Geometric distribution: Number of records before the next sampled one
+			if not self.skip(int(math.log(1. - self.rng.random()) / log_q)):
+				return
+			records = self.read()
+			if records is None:
+				return
+			yield records
+	
+	def iter_reservoir(self, n: int) -> Generator[Tuple[Record, ...], None, None]:
+		reservoir: List[Tuple[Record, ...]] = []
+		while len(reservoir) < n:
+			records = self.read()
+			if records is None:
+				yield from reservoir
+				return
+			reservoir.append(records)
+		
+		w = math.exp(math.log(1. - self.rng.random()) / n)
+		while True:
+			if not self.skip(int(math.log(1. - self.rng.random()) / math.log1p(-w))):
+				break
+			records = self.read()
+			if records is None:
+				break
+			reservoir[self.rng.randrange(n)] = records
+			w *= math.exp(math.log(1. - self.rng.random()) / n)
+		yield from reservoir
+
+
+def wilson_interval(k: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+	"""Wilson score interval for a proportion of ``k`` in ``n`` (95% for the default ``z``)"""
+	if n == 0:
+		return 0., 1.
+	p = k / n
+	denominator = 1 + z**2 / n
+	center = (p + z**2 / (2 * n)) / denominator
+	half = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+	return max(0., center - half), min(1., center + half)
+
+
+def get_sample_stats(
+	sampler: Sampler,
+	n_reads: int,
+	n_both_regular: Optional[int],
+	*stats: Optional[Dict[str, int]],
+	seed: Optional[int] = None,
+) -> dict:
+	"""Sampling parameters and confidence intervals for the fraction of reads in each stats category"""
+	sample_stats = dict(
+		sample=sampler.sample,
+		seed=seed,
+		n_scanned=sampler.n_scanned,
+	)
+	if n_both_regular is not None:
+		sample_stats['n_both_regular'] = wilson_interval(n_both_regular, n_reads)
+	for r, stats_read in enumerate(stats, 1):
+		if stats_read is None:
+			continue
+		sample_stats[f'read{r}'] = {name: wilson_interval(count, n_reads) for name, count in stats_read.items()}
+	return sample_stats
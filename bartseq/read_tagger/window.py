@@ -0,0 +1,68 @@
+"""Restrict the barcode search to the start of reads, learned from where barcodes were found in the first reads"""
+from collections import Counter
+from typing import Optional, Dict
+
+from . import defaults
+
+
+class SearchWindow:
+	"""
+	Learns how far into reads barcodes start.
+	
+	Until ``n_warmup`` barcodes have been found, whole reads are searched.
+	Then :attr:`end` is set to the ``quantile`` of the barcode starts plus barcode length and ``margin``,
+	and the bases before it are searched first. Reads without barcode there are searched completely,
+	the rest of the others only for other barcodes, so the results are the same as without window.
+	"""
+	def __init__(
+		self,
+		quantile: float,
+		*,
+		len_barcode: int,
+		margin: int = defaults.search_margin,
+		n_warmup: int = defaults.search_warmup,
+	):
+		"""
+		:param quantile: Fraction of barcode starts during the warmup that need to be inside of the window, e.g. 0.999
+		:param len_barcode: Length of the longest barcode
+		:param margin: Number of bases to add to the window
+		:param n_warmup: Number of barcodes to find before learning the window
+		"""
+		self.quantile = quantile
+		self.len_barcode = len_barcode
+		self.margin = margin
+		self.n_warmup = n_warmup
+		self.offsets: Counter[int] = Counter()  # Histogram of barcode starts
+		self.n_found = 0
+		self.end: Optional[int] = None
+		self.n_in_window = 0
+		self.n_fallback = 0
+		self.n_fallback_found = 0
+	
+	def add(self, offset: int):
+		self.offsets[offset] += 1
+		self.n_found += 1
+		if self.end is None and self.n_found >= self.n_warmup:
+			self.learn()
+	
+	def learn(self):
+		n_inside = 0
+		for offset, count in sorted(self.offsets.items()):
+			n_inside += count
+			if n_inside >= self.quantile * self.n_found:
+				break
+		self.end = offset + self.len_barcode + self.margin
+	
+	def get_stats(self) -> Dict[str, object]:
+		n_searched = self.n_in_window + self.n_fallback
+		return dict(
+			quantile=self.quantile,
+			margin=self.margin,
+			n_warmup=self.n_warmup,
+			end=self.end,
+			n_in_window=self.n_in_window,
+			n_fallback=self.n_fallback,
+			n_fallback_found=self.n_fallback_found,
+			fallback_rate=self.n_fallback / n_searched if n_searched else 0.,
+			offsets=dict(sorted(self.offsets.items())),
+		)
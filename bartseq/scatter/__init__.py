@@ -0,0 +1,161 @@
+"""
+Scatter-gather processing of huge libraries:
+Split read pairs into shards that are tagged, mapped and counted in parallel,
+then merge their stats, HISAT2 summaries and counts into the ones the whole library would have had.
+"""
+import collections
+import json
+import re
+from contextlib import ExitStack
+from itertools import count, islice
+from pathlib import Path
+from typing import Sequence, Union, List, Dict, Iterable, Counter, Tuple, Optional
+
+from ..io import transparent_open
+from ..read_tagger.io import write_stats
+from ..xlsx_export.main import RE_SUMMARY, STATS
+
+
+RE_SHARD = re.compile(r'\.part\d')
+
+
+def is_shard(library: str) -> bool:
+	"""Whether a library name is a shard’s (“<library>.part<number>”), whose counts belong to its library"""
+	return RE_SHARD.search(library) is not None
+
+
+def split_fastq(
+	ins: Sequence[Union[Path, str]],
+	out_pattern: str,
+	n_shards: int,
+	*,
+	chunk_size: int = 10000,
+	level: Optional[int] = None,
+) -> List[int]:
+	"""
+	Split (paired) FASTQ files into shards, distributing chunks of records round-robin.
+	Shards of paired files contain the same read pairs in the same order.
+	:param ins: One or two FASTQ files
+	:param out_pattern: Output path with ``{shard}`` and ``{read}`` placeholders,
+		e.g. ``Lib1.part{shard}_R{read}.fastq.zst``
+	:param n_shards: Number of shards
+	:param chunk_size: Number of records to write to a shard at once
+	:param level: Compression level of the shards
+	:return: Number of records per shard
+	"""
+	n_records = [0] * n_shards
+	with ExitStack() as stack:
+		fs_in = [stack.enter_context(transparent_open(path, 'rb')) for path in ins]
+		fs_out = [
+			[
+				stack.enter_context(transparent_open(
+					out_pattern.format(shard=shard, read=read), 'wb', ensure_parentdir=True, level=level,
+				))
+				for read in range(1, len(ins) + 1)
+			]
+			for shard in range(n_shards)
+		]
+		for c in count():
+			chunks = [list(islice(f, 4 * chunk_size)) for f in fs_in]
+			n_lines = len(chunks[0])
+			if any(len(chunk) != n_lines for chunk in chunks):
+				raise IOError('Read files have different numbers of records')
+			if n_lines == 0:
+				break
+			if n_lines % 4 != 0 or any(not chunk[0].startswith(b'@') for chunk in chunks):
+				raise IOError(f'Invalid FASTQ record around record {sum(n_records)}')
+			shard = c % n_shards
+			for f, chunk in zip(fs_out[shard], chunks):
+				f.write(b''.join(chunk))
+			n_records[shard] += n_lines // 4
+	return n_records
+
+
+def sum_dicts(dicts: Sequence[Dict[str, int]]) -> Dict[str, int]:
+	"""Sum up values by key, in the order of the keys’ first occurrences"""
+	summed: Dict[str, int] = {}
+	for d in dicts:
+		for key, value in d.items():
+			summed[key] = summed.get(key, 0) + value
+	return summed
+
+
+def merge_cache_stats(shards: Sequence[dict]) -> dict:
+	merged = dict(size=shards[0]['size'], **sum_dicts([dict(n_hits=s['n_hits'], n_misses=s['n_misses']) for s in shards]))
+	n_lookups = merged['n_hits'] + merged['n_misses']
+	merged['hit_rate'] = merged['n_hits'] / n_lookups if n_lookups else 0.
+	return merged
+
+
+def merge_window_stats(shards: Sequence[dict]) -> dict:
+	merged = {key: shards[0][key] for key in ['quantile', 'margin', 'n_warmup']}
+	merged['ends'] = [s['end'] for s in shards]  # Every shard learns its own window
+	merged.update(sum_dicts([{key: s[key] for key in ['n_in_window', 'n_fallback', 'n_fallback_found']} for s in shards]))
+	n_searched = merged['n_in_window'] + merged['n_fallback']
+	merged['fallback_rate'] = merged['n_fallback'] / n_searched if n_searched else 0.
+	offsets = sum_dicts([s['offsets'] for s in shards])
+	merged['offsets'] = {offset: offsets[offset] for offset in sorted(offsets, key=int)}
+	return merged
+
+
+def merge_stats(shards: Sequence[dict]) -> Tuple[int, Optional[int], dict, Optional[dict], Dict[str, Optional[dict]]]:
+	"""
+	Merge stats written by the tagger for each shard
+	:return: Arguments for :func:`bartseq.read_tagger.io.write_stats`
+	"""
+	if any('sample' in stats for stats in shards):
+		raise ValueError('Cannot merge stats of sampled reads, the confidence intervals would be wrong')
+	n_reads = sum(stats['n_reads'] for stats in shards)
+	n_both_regular = sum(stats['n_both_regular'] for stats in shards) if 'n_both_regular' in shards[0] else None
+	stats1 = sum_dicts([stats['read1'] for stats in shards])
+	stats2 = sum_dicts([stats['read2'] for stats in shards]) if 'read2' in shards[0] else None
+	extra = {}
+	for section, merge in [('cache', merge_cache_stats), ('search_window', merge_window_stats)]:
+		if section in shards[0]:
+			extra[section] = {read: merge([stats[section][read] for stats in shards]) for read in shards[0][section]}
+	return n_reads, n_both_regular, stats1, stats2, extra
+
+
+def merge_stats_files(paths: Iterable[Union[Path, str]], out: Union[Path, str]):
+	shards = [json.loads(Path(path).read_bytes()) for path in paths]
+	n_reads, n_both_regular, stats1, stats2, extra = merge_stats(shards)
+	write_stats(out, n_reads, n_both_regular, stats1, stats2, **extra)
+
+
+def merge_counts(paths: Iterable[Union[Path, str]]) -> Counter[Tuple[str, str, str]]:
+	"""Sum up count tables as written by the counter"""
+	counts = collections.Counter()
+	for path in paths:
+		with open(path) as f:
+			next(f)  # header
+			for line in f:
+				bc_l, bc_r, amp, c = line.rstrip('\n').split('\t')
+				counts[bc_l, bc_r, amp] += int(c)
+	return counts
+
+
+def format_summary(total: int, zero: int, one: int, more: int) -> str:
+	"""Format alignment stats like HISAT2’s ``--new-summary``"""
+	def pct(n: int) -> str:
+		return f'{n / total:.2%}' if total else '0.00%'
+	
+	return (
+		'HISAT2 summary stats:\n'
+		f'\tTotal reads: {total}\n'
+		f'\t\tAligned 0 time: {zero} ({pct(zero)})\n'
+		f'\t\tAligned 1 time: {one} ({pct(one)})\n'
+		f'\t\tAligned >1 times: {more} ({pct(more)})\n'
+		f'\tOverall alignment rate: {pct(one + more)}\n'
+	)
+
+
+def merge_summaries(paths: Iterable[Union[Path, str]], out: Union[Path, str]):
+	"""Sum up HISAT2 summary files"""
+	totals = dict.fromkeys(STATS, 0)
+	for path in paths:
+		match = RE_SUMMARY.match(Path(path).read_text('utf-8'))
+		if not match:
+			raise ValueError(f'{path} is not a HISAT2 summary')
+		for stat in STATS:
+			totals[stat] += int(match[stat])
+	Path(out).write_text(format_summary(**totals), 'utf-8')
@@ -0,0 +1,82 @@
+from argparse import ArgumentParser, Namespace
+
+from ..cli_helpers import CLI, t_out_file
+
+
+class SplitCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'in_1',
+			help='Read1 file to split. Supported compression: see “tag --in-compression”')
+		parser.add_argument(
+			'out_pattern', help=(
+				'Path of the shards with “{shard}” and “{read}” placeholders, e.g. “Lib1.part{shard}_R{read}.fastq.zst”. '
+				'Supported compression: see “tag --out-compression”'))
+		parser.add_argument(
+			'--in-2',
+			help='Read2 file to split in sync with in_1')
+		parser.add_argument(
+			'--shards', '-n', type=int, required=True,
+			help='Number of shards')
+		parser.add_argument(
+			'--chunk-size', type=int, default=10000,
+			help='Number of records to write to a shard at once. Chunks are distributed round-robin')
+		parser.add_argument(
+			'--out-level', type=int,
+			help='Compression level of the shards')
+		return parser
+	
+	@staticmethod
+	def check_args(parser: ArgumentParser, args: Namespace):
+		if args.shards < 1:
+			parser.error('--shards needs to be at least 1')
+		if '{shard}' not in args.out_pattern or (args.in_2 and '{read}' not in args.out_pattern):
+			parser.error('out_pattern needs a “{shard}” placeholder, and a “{read}” placeholder if --in-2 is specified')
+	
+	@staticmethod
+	def run(parser: ArgumentParser, args: Namespace):
+		from . import split_fastq
+		ins = [args.in_1, args.in_2] if args.in_2 else [args.in_1]
+		n_records = split_fastq(ins, args.out_pattern, args.shards, chunk_size=args.chunk_size, level=args.out_level)
+		print(f'Split {sum(n_records)} records into {args.shards} shards')
+
+
+class MergeStatsCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'ins', nargs='+', metavar='in',
+			help='Stats files written by “tag” for each shard')
+		parser.add_argument(
+			'out', type=t_out_file,
+			help='Stats file to write')
+		return parser
+	
+	@staticmethod
+	def run(parser: ArgumentParser, args: Namespace):
+		from . import merge_stats_files
+		merge_stats_files(args.ins, args.out)
+
+
+class MergeCountsCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'ins', nargs='+', metavar='in',
+			help='Count tables written by “count” for each shard')
+		parser.add_argument(
+			'out', type=t_out_file,
+			help='Count table to write')
+		return parser
+	
+	@staticmethod
+	def run(parser: ArgumentParser, args: Namespace):
+		from . import merge_counts
+		from ..counter.main import print_counter
+		counts = merge_counts(args.ins)
+		if isinstance(args.out, str):
+			with open(args.out, 'w') as f:
+				print_counter(counts, f)
+		else:
+			print_counter(counts, args.out)
@@ -0,0 +1,33 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from .main import main
+from ..cli_helpers import CLI, t_out_file, clean_kbdinterrupt
+
+
+class XlsxExportCLI(CLI):
+	@staticmethod
+	def populate_parser(parser: ArgumentParser) -> ArgumentParser:
+		parser.add_argument(
+			'data_dir', type=Path,
+			help='Data directory to read from. Needs to have the directories “./process/{4-mapped,5-counts}” filled.')
+		parser.add_argument(
+			'counting', choices=['both', 'one'],
+			help='Which counts to export.')
+		parser.add_argument(
+			'out', nargs='?', type=t_out_file,
+			help='Excel file to write to. Default: “./out/counts/{counting}/{counting}.xlsx”')
+		parser.add_argument(
+			'--library', '-l', dest='libraries', action='append',
+			help='Library to export. Can be specified multiple times. Default: All counted libraries')
+		return parser
+	
+	@staticmethod
+	@clean_kbdinterrupt
+	def run(parser: ArgumentParser, args: Namespace):
+		kwargs = vars(args)
+		del kwargs['func']
+		main(**kwargs)
+
+
+cli = XlsxExportCLI()
@@ -0,0 +1,111 @@
+import re
+from pathlib import Path
+from typing import Union, Dict, Iterable, Generator, Tuple, List, Optional, BinaryIO
+
+from ..counter.store import CountStore, STORE_PATH, read_count_table
+
+
+RE_SUMMARY = re.compile(r'''HISAT2 summary stats:
+	Total reads: (?P<total>\d+)
+		Aligned 0 time: (?P<zero>\d+) \(\d+\.\d+%\)
+		Aligned 1 time: (?P<one>\d+) \(\d+\.\d+%\)
+		Aligned >1 times: (?P<more>\d+) \(\d+\.\d+%\)
+	Overall alignment rate: \d+\.\d+%''')
+RE_SUMMARY_FILE = re.compile(r'(?P<lib>.+)_R(?P<read>[12])_summary\.txt')
+STATS = ['total', 'zero', 'one', 'more']
+
+
+def iter_summary_rows(paths: Iterable[Union[Path, str]]) -> Generator[list, None, None]:
+	"""Rows of library, read and HISAT2 summary stats"""
+	yield ['library', 'read', *STATS]
+	for path in map(Path, paths):
+		stats_match = RE_SUMMARY.match(path.read_text('utf-8'))
+		name_match = RE_SUMMARY_FILE.fullmatch(path.name)
+		yield [name_match['lib'], int(name_match['read']), *(int(stats_match[stat]) for stat in STATS)]
+
+
+def iter_count_rows(entries: Iterable[Tuple[str, str, str, int]]) -> Generator[list, None, None]:
+	"""
+	Rows of left and right barcode with the counts per amplicon, streamed from count entries.
+	Only one library’s barcode pairs are held in memory.
+	"""
+	counts: Dict[Tuple[str, str], Dict[str, int]] = {}
+	amplicons = set()
+	for bc_l, bc_r, amp, count in entries:
+		if not (bc_l.startswith('L') and bc_r.startswith('R')):
+			continue
+		counts.setdefault((bc_l, bc_r), {})[amp] = count
+		amplicons.add(amp)
+	
+	amplicons = sorted(amplicons)
+	yield ['bc_l', 'bc_r', *amplicons]
+	for bcs in sorted(counts):
+		by_amp = counts[bcs]
+		yield [*bcs, *(by_amp.get(amp, 0) for amp in amplicons)]
+
+
+def export_xlsx(
+	out: Union[Path, str, BinaryIO],
+	counts: Dict[str, Iterable[Tuple[str, str, str, int]]],
+	paths_summaries: Iterable[Union[Path, str]],
+):
+	"""
+	Write HISAT2 summaries and per-library count tables to an Excel file using write-only worksheets
+	:param out: Excel file to write to
+	:param counts: Count entries (bc_l, bc_r, amp, count) for each library,
+		e.g. from :meth:`bartseq.counter.store.CountStore.iter_library` or :func:`read_count_table`
+	:param paths_summaries: HISAT2 summary files named ``<libname>_R{1,2}_summary.txt``
+	"""
+	import openpyxl
+	
+	wb = openpyxl.Workbook(write_only=True)
+	ws = wb.create_sheet('Statistics')
+	for row in iter_summary_rows(paths_summaries):
+		ws.append(row)
+	for lib, entries in counts.items():
+		ws = wb.create_sheet(lib)
+		for row in iter_count_rows(entries):
+			ws.append(row)
+	wb.save(out)
+
+
+def main(
+	data_dir: Path,
+	counting: str,
+	out: Optional[Union[Path, str, BinaryIO]] = None,
+	*,
+	libraries: Optional[List[str]] = None,
+):
+	"""
+	Export counts from the count store if it exists, otherwise from the count tables.
+	The store is synced with the count tables first.
+	"""
+	from ..scatter import is_shard
+	
+	path_store = data_dir / STORE_PATH
+	dir_counts = data_dir / 'process' / '5-counts' / counting
+	# Skip snapshots of running count jobs (“<library>.partial.tsv”) and shards counted on their own
+	paths_counts = {
+		path.stem: path for path in sorted(dir_counts.glob('*.tsv'))
+		if not path.name.endswith('.partial.tsv') and not is_shard(path.stem)
+	}
+	store = CountStore(path_store) if path_store.is_file() else None
+	if store:
+		# Adds libraries counted before the store existed and re-reads tables changed outside of it
+		store.sync(paths_counts, counting)
+	if libraries is None:
+		libraries = sorted(paths_counts)
+	if out is None:
+		out = data_dir / 'out' / 'counts' / counting / f'{counting}.xlsx'
+	out = getattr(out, 'buffer', out)
+	
+	paths_summaries = [
+		path
+		for lib in libraries
+		for path in sorted((data_dir / 'process' / '4-mapped').glob(f'{lib}_R[12]_summary.txt'))
+	]
+	if store:
+		with store:
+			export_xlsx(out, {lib: store.iter_library(lib, counting, only_lr=True) for lib in libraries}, paths_summaries)
+	else:
+		export_xlsx(out, {lib: read_count_table(dir_counts / f'{lib}.tsv') for lib in libraries}, paths_summaries)
@@ -0,0 +1,32 @@
+"""Time the barcode ambiguity analysis for growing barcode sets"""
+import random
+import warnings
+from time import perf_counter
+
+from bartseq.read_tagger import ReadTagger
+
+
+def random_barcodes(n: int, length: int = 8, seed: int = 0):
+	rng = random.Random(seed)
+	barcodes = set()
+	while len(barcodes) < n:
+		barcodes.add(''.join(rng.choice('ACGT') for _ in range(length)))
+	return {bc: f'L{i:04}' for i, bc in enumerate(sorted(barcodes))}
+
+
+def main():
+	for n in [96, 384, 1536]:
+		bc_to_id = random_barcodes(n)
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore')
+			start = perf_counter()
+			tagger = ReadTagger(bc_to_id, 10, 27)
+			t_init = perf_counter() - start
+		start = perf_counter()
+		tagger.get_barcode_table()
+		t_table = perf_counter() - start
+		print(f'{n:5} barcodes: init {t_init:.2f}s, table {t_table:.2f}s, {len(tagger.blacklist)} blacklisted patterns')
+
+
+if __name__ == '__main__':
+	main()
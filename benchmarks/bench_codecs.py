@@ -0,0 +1,53 @@
+"""
+Compare compressions for tagged reads: Time to write and to read them twice (like HISAT2 and the counter), and size.
+
+Usage: ``python benchmarks/bench_codecs.py tagged_R1.fastq.gz`` (any supported compression or uncompressed FASTQ)
+"""
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from bartseq.io import transparent_open
+
+CODECS = [
+	('gz', None, None),
+	('gz', 1, None),
+	('zst', None, None),
+	('zst', None, -1),
+	('zst', 9, None),
+	('lz4', None, None),
+]
+
+
+def main(path: str):
+	with transparent_open(path, 'rb') as f:
+		data = f.read()
+	print(f'{path}: {len(data) / 2**20:.1f} MiB uncompressed')
+	with tempfile.TemporaryDirectory() as tmp:
+		for codec, level, threads in CODECS:
+			path_out = Path(tmp) / f'reads.fastq.{codec}'
+			try:
+				start = perf_counter()
+				with transparent_open(path_out, 'wb', level=level, threads=threads) as f:
+					f.write(data)
+				t_write = perf_counter() - start
+			except ImportError as e:
+				print(f'{codec:>3}: {e}')
+				continue
+			start = perf_counter()
+			for _ in range(2):
+				with transparent_open(path_out, 'rb') as f:
+					while f.read(2**20):
+						pass
+			t_read = perf_counter() - start
+			size = path_out.stat().st_size
+			label = f'{codec} level={level} threads={threads}'
+			print(
+				f'{label:<28} write {t_write:5.2f}s, read twice {t_read:5.2f}s, '
+				f'{size / 2**20:6.1f} MiB ({size / len(data):.1%})'
+			)
+
+
+if __name__ == '__main__':
+	main(*sys.argv[1:])
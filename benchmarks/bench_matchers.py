@@ -0,0 +1,52 @@
+"""
+Time barcode search with each matcher backend on the same synthetic library.
+
+Run with CPython and PyPy to compare, e.g. ``python benchmarks/bench_matchers.py`` and ``pypy3 benchmarks/…``
+"""
+import platform
+import random
+import warnings
+from time import perf_counter
+
+from bartseq.read_tagger import ReadTagger
+from bartseq.read_tagger.matchers import MATCHERS, default_matcher
+
+from bench_barcodes import random_barcodes
+
+
+def random_reads(barcodes, n: int, length: int = 150, seed: int = 0):
+	"""Reads with a short junk prefix, a barcode and a random rest, and 5% without barcode"""
+	rng = random.Random(seed)
+	barcodes = list(barcodes)
+	reads = []
+	for _ in range(n):
+		junk = ''.join(rng.choice('ACGT') for _ in range(rng.randint(0, 6)))
+		barcode = rng.choice(barcodes) if rng.random() > .05 else ''
+		rest = ''.join(rng.choice('ACGT') for _ in range(length - len(junk) - len(barcode)))
+		reads.append(junk + barcode + rest)
+	return reads
+
+
+def main():
+	print(f'{platform.python_implementation()} {platform.python_version()}, default matcher: {default_matcher()}')
+	for n_barcodes in [96, 384]:
+		bc_to_id = random_barcodes(n_barcodes)
+		reads = random_reads(bc_to_id, 100_000)
+		for name in MATCHERS:
+			with warnings.catch_warnings():
+				warnings.simplefilter('ignore')
+				try:
+					tagger = ReadTagger(bc_to_id, 10, 27, matcher=name)
+				except ImportError as e:
+					print(f'{name:>12}: {e}')
+					continue
+			for _ in range(2):  # The second round shows the speed after JIT warmup
+				start = perf_counter()
+				for read in reads:
+					tagger.find_barcode(read)
+				elapsed = perf_counter() - start
+			print(f'{n_barcodes:5} barcodes, {name:>12}: {len(reads) / elapsed:,.0f} reads/s')
+
+
+if __name__ == '__main__':
+	main()
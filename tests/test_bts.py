@@ -0,0 +1,37 @@
+from bartseq.bts import BtsWriter, BtsReader, iter_bts_fq
+from bartseq.index import ReadIndexer, ReadIndex
+from bartseq.read_tagger import TaggedRead
+
+
+reads = [
+	TaggedRead('@r0 1:N', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 3, 'CC', 'L01', 'GTAC', 'ACGTNACGTA', frozenset({'R02'}), True),
+	TaggedRead('@r1', 'IIIII', 3, None, None, None, 'ACGTA', frozenset(), False),
+	TaggedRead('@r2 x', '#' * 14, 3, None, 'R02', '', 'TTTTTTTTT', frozenset(), False),
+]
+
+
+def test_roundtrip(tmp_path):
+	path = tmp_path / 'r.bts'
+	with BtsWriter(path, ['L01', 'R02'], len_primer=3, block_size=2) as writer:
+		for read in reads:
+			writer.write(read)
+	
+	with BtsReader(path) as reader:
+		assert [str(read) for read in reader] == [str(read) for read in reads]
+	with BtsReader(path) as reader:
+		assert list(reader.iter_barcodes()) == [('L01', True), (None, False), ('R02', False)]
+
+
+def test_indexed(tmp_path):
+	path = tmp_path / 'r.bts'
+	with BtsWriter(path, ['L01', 'R02'], len_primer=3, bin_qual=True) as writer:
+		indexer = ReadIndexer([writer], tmp_path / 'index.json', 2)
+		for read in reads:
+			indexer.write(read)
+		indexer.close()
+	
+	block = ReadIndex.load(tmp_path / 'index.json').blocks[1]
+	header, seq, qual = next(iter_bts_fq(path, block.offsets[0]))
+	assert header.startswith('@r2 x barcode=R02 linker= ')
+	assert seq == 'TTTTTTTTT'
+	assert qual == "'" * 9  # Q2 is binned to Q6
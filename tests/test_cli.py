@@ -0,0 +1,11 @@
+from argparse import ArgumentParser
+
+import pytest
+
+from bartseq.cli import SUBCMDS
+
+
+@pytest.mark.parametrize('name', SUBCMDS)
+def test_help(name):
+	parser = SUBCMDS[name].populate_parser(ArgumentParser(prog=f'bartseq {name}'))
+	assert parser.format_help().startswith(f'usage: bartseq {name}')
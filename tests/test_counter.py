@@ -0,0 +1,180 @@
+import gzip
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from bartseq.counter import count
+from bartseq.counter.matrices import counts_to_frame, write_lib_matrices, to_matrix
+from bartseq.counter.follow import follow_lines
+from bartseq.counter.main import print_counter, main as run_counter
+from bartseq.counter.store import CountStore, STORE_PATH
+from bartseq.manifest import get_stamp
+from bartseq.scatter import format_summary
+
+
+counts = Counter({
+	('L01', 'R01', 'ampA'): 3,
+	('L01', 'R02', 'ampA'): 1,
+	('L01', 'R01', 'ampB'): 2,
+	('L01', 'L02', 'ampB'): 5,
+})
+
+
+def test_to_matrix():
+	table = to_matrix(counts_to_frame(counts))
+	assert table.loc['L01', 'R01'] == 5
+	assert table.loc['L01', 'L02'] == 5
+	assert to_matrix(counts_to_frame(Counter())).shape == (0, 0)
+
+
+def test_write_lib_matrices(tmp_path):
+	paths = write_lib_matrices(counts_to_frame(counts), tmp_path, 'Lib1', ['ampA', 'ampB', '-unmapped'])
+	assert len(paths) == 8
+	
+	amp_b = pd.read_csv(tmp_path / 'Lib1' / 'ampB' / 'Lib1-ampB.tsv', sep='\t', index_col='bc_l')
+	assert list(amp_b.columns) == ['R01']
+	assert amp_b.loc['L01', 'R01'] == 2
+	
+	lib = pd.read_csv(tmp_path / 'Lib1' / 'Lib1-all.tsv', sep='\t', index_col='bc_l')
+	# Summed, not NaN where one amplicon has no counts
+	assert lib.loc['L01', 'R02'] == 1
+	assert lib.loc['L01', 'R01'] == 5
+
+
+def test_count_store(tmp_path):
+	with CountStore(tmp_path / 'counts.sqlite') as store:
+		store.replace_library('Lib1', 'both', counts)
+		store.replace_library('Lib2', 'both', Counter({('L01', 'R01', 'ampA'): 1, ('L03', 'R01', 'ampA'): 4}))
+		store.replace_library('Lib2', 'both', Counter({('L01', 'R01', 'ampA'): 2}))  # re-counted
+		assert store.libraries('both') == ['Lib1', 'Lib2']
+		assert store.libraries('one') == []
+		assert list(store.iter_library('Lib1', 'both', only_lr=True))[0] == ('L01', 'R01', 'ampA', 3)
+		
+		table = to_matrix(store.totals('both'))
+		assert table.loc['L01', 'R01'] == 3 + 2 + 2
+		assert 'L03' not in table.index
+		
+		store.retain_libraries(['Lib2'], 'both')
+		assert to_matrix(store.totals('both')).loc['L01', 'R01'] == 2
+	
+	with CountStore(tmp_path / 'counts.sqlite', readonly=True) as store:
+		assert store.libraries('both') == ['Lib2']
+		with pytest.raises(sqlite3.OperationalError):
+			store.replace_library('Lib1', 'both', counts)
+
+
+def test_count_store_sync(tmp_path):
+	paths = {lib: tmp_path / f'{lib}.tsv' for lib in ['Lib1', 'Lib2']}
+	
+	def write(lib: str, counter: Counter, mtime_ns: int):
+		with paths[lib].open('w') as f:
+			print_counter(counter, f)
+		os.utime(paths[lib], ns=(mtime_ns, mtime_ns))
+	
+	write('Lib1', counts, 10**18)
+	write('Lib2', Counter({('L01', 'R01', 'ampA'): 1}), 10**18)
+	with CountStore(tmp_path / 'counts.sqlite') as store:
+		store.sync(paths, 'both')
+		assert to_matrix(store.totals('both')).loc['L01', 'R01'] == 3 + 2 + 1
+		
+		# A count table restored or regenerated without going through the store
+		write('Lib2', Counter({('L01', 'R01', 'ampA'): 7}), 2 * 10**18)
+		store.sync(paths, 'both')
+		assert list(store.iter_library('Lib2', 'both')) == [('L01', 'R01', 'ampA', 7)]
+		assert to_matrix(store.totals('both')).loc['L01', 'R01'] == 3 + 2 + 7
+		assert store.source_stamps('both') == {lib: get_stamp(path) for lib, path in paths.items()}
+		
+		store.sync({'Lib1': paths['Lib1']}, 'both')
+		assert store.source_stamps('both') == {'Lib1': get_stamp(paths['Lib1'])}
+
+
+def test_follow_lines(tmp_path):
+	path = tmp_path / 'Lib1_R1.tsv'
+	done = threading.Event()
+	
+	def write():
+		with path.open('w') as f:
+			for i in range(5):
+				f.write(f'amp{i}\tACGT\n' if i < 4 else 'amp4\tAC')  # The last line is written in two parts
+				f.flush()
+				time.sleep(.02)
+			f.write('GT\n')
+		done.set()
+	
+	writer = threading.Thread(target=write)
+	writer.start()
+	lines = list(follow_lines(path, lambda n_lines: done.is_set(), poll_interval=.005))
+	writer.join()
+	assert lines == [f'amp{i}\tACGT' for i in range(5)]
+	
+	with pytest.raises(TimeoutError):
+		list(follow_lines(tmp_path / 'missing.tsv', lambda n_lines: False, poll_interval=.005, timeout=.02))
+
+
+def write_tagged_reads(data_dir, library, bcs):
+	for r in [0, 1]:
+		with gzip.open(data_dir / 'process' / '3-tagged' / f'{library}_R{r + 1}.fastq.gz', 'wt') as f:
+			for i, bc in enumerate(bcs):
+				f.write(f'@read{i} barcode={bc[r]} barcode-mismatch=False\nACGT\n+\nIIII\n')
+
+
+def test_count_follow(tmp_path):
+	(tmp_path / 'process' / '3-tagged').mkdir(parents=True)
+	(tmp_path / 'process' / '4-mapped').mkdir(parents=True)
+	bcs = [('L01', 'R01'), ('L01', 'R02'), ('R01', 'L01'), ('L02', 'R01')]
+	amps = [('ampA', 'ampA'), ('*', 'ampA'), ('ampA', 'ampA'), ('ampA', 'ampB')]
+	write_tagged_reads(tmp_path, 'Lib1', bcs)
+	
+	def write():
+		# Like HISAT2: The mapping files grow line by line, the summaries are written at the end
+		paths = [tmp_path / 'process' / '4-mapped' / f'Lib1_R{r}.tsv' for r in [1, 2]]
+		files = [path.open('w') for path in paths]
+		for pair in amps:
+			for f, amp in zip(files, pair):
+				f.write(f'{amp}\tACGT\n')
+				f.flush()
+			time.sleep(.05)
+		for r, f in enumerate(files, 1):
+			f.close()
+			n_mapped = sum(pair[r - 1] != '*' for pair in amps)
+			summary = format_summary(len(amps), len(amps) - n_mapped, n_mapped, 0)
+			(tmp_path / 'process' / '4-mapped' / f'Lib1_R{r}_summary.txt').write_text(summary)
+	
+	writer = threading.Thread(target=write)
+	writer.start()
+	try:
+		counts_both, counts_one = count(tmp_path, 'Lib1', follow=True, follow_timeout=10)
+	finally:
+		writer.join()
+	assert counts_both == Counter({
+		('L01', 'R01', 'ampA'): 2,
+		('L01', 'R02', '-one-mapped'): 1,
+		('L02', 'R01', '-mismatch'): 1,
+	})
+	assert counts_one == Counter({
+		('L01', 'R01', 'ampA'): 2,
+		('L01', 'R02', 'ampA'): 1,
+	})
+
+
+def test_count_shard_skips_store(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	for path in ['3-tagged', '4-mapped', '5-counts/both', '5-counts/one']:
+		(tmp_path / 'process' / path).mkdir(parents=True)
+	for library in ['Lib1.part0', 'Lib1']:
+		write_tagged_reads(tmp_path, library, [('L01', 'R01')])
+		for r in [1, 2]:
+			(tmp_path / 'process' / '4-mapped' / f'{library}_R{r}.tsv').write_text('ampA\tACGT\n')
+	
+	run_counter(tmp_path, 'Lib1.part0')
+	assert (tmp_path / 'process' / '5-counts' / 'both' / 'Lib1.part0.tsv').is_file()
+	assert not (tmp_path / STORE_PATH).exists()
+	
+	run_counter(tmp_path, 'Lib1')
+	with CountStore(tmp_path / STORE_PATH) as store:
+		assert store.libraries('both') == ['Lib1']
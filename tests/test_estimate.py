@@ -0,0 +1,52 @@
+import gzip
+import random
+
+from bartseq.estimate import sample_fastq, measure_library, estimate_resources, load_library_stats
+
+
+def write_reads(path, n: int, barcode: str):
+	rng = random.Random(0)
+	with gzip.open(path, 'wt') as f:
+		for i in range(n):
+			seq = 'ACG' + barcode + ''.join(rng.choices('ACGT', k=80))
+			f.write(f'@r{i}\n{seq}\n+\n{"I" * len(seq)}\n')
+
+
+def test_sample_fastq(tmp_path):
+	write_reads(tmp_path / 'r.fastq.gz', 1000, 'AAAACCCC')
+	sample = sample_fastq(tmp_path / 'r.fastq.gz', n_records=10)
+	assert [header for header, _, _ in sample.records] == [f'@r{i}' for i in range(10)]
+	
+	sample = sample_fastq(tmp_path / 'r.fastq.gz', n_records=10, sample_bytes=2**12)
+	assert 1 < sample.ratio < 10
+
+
+def test_estimate_resources(tmp_path):
+	paths = [tmp_path / f'r{read}.fastq.gz' for read in [1, 2]]
+	write_reads(paths[0], 5000, 'AAAACCCC')
+	write_reads(paths[1], 5000, 'GGGGTTTT')
+	(tmp_path / 'barcodes.fa').write_text('>L01\nAAAACCCC\n>R01\nGGGGTTTT\n')
+	
+	stats = measure_library(paths, tmp_path / 'barcodes.fa', n_records=500)
+	assert stats.n_reads == 5000  # The whole file fits into the sample
+	assert stats.rate_regular == 1.
+	
+	resources = estimate_resources(stats, n_amplicons=10)
+	sharded = estimate_resources(stats._replace(n_reads=10**7), n_amplicons=10, n_shards=2)
+	assert 'split_reads' in sharded and 'split_reads' not in resources
+	assert sharded['map_reads'].threads > resources['map_reads'].threads
+
+
+def test_load_library_stats(tmp_path):
+	(tmp_path / 'in' / 'reads').mkdir(parents=True)
+	write_reads(tmp_path / 'in' / 'reads' / 'Lib1_R1_001.fastq.gz', 500, 'AAAACCCC')
+	write_reads(tmp_path / 'in' / 'reads' / 'Lib1_R2_001.fastq.gz', 500, 'GGGGTTTT')
+	(tmp_path / 'in' / 'barcodes.fa').write_text('>L01\nAAAACCCC\n>R01\nGGGGTTTT\n')
+	
+	stats = load_library_stats(tmp_path, 'Lib1')
+	assert stats.rate_regular == 1.
+	assert load_library_stats(tmp_path, 'Lib1') == stats  # cached
+	
+	# The reads don’t contain the linkers after the barcodes
+	(tmp_path / 'in' / 'linkers.fa').write_text('>Left\nTTTTTTTT\n>Right\nTTTTTTTT\n')
+	assert load_library_stats(tmp_path, 'Lib1').rate_regular == 0.
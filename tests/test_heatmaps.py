@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from bartseq.heatmaps import render_heatmap, EMPTY_PNG
+
+
+def read_png(path) -> np.ndarray:
+	from matplotlib.image import imread
+	assert path.read_bytes().startswith(b'\x89PNG\r\n\x1a\n')
+	return imread(str(path))
+
+
+def test_render_heatmap(tmp_path):
+	table = pd.DataFrame(
+		[[1, 20, np.nan], [300, np.nan, 4]],
+		index=['L01', 'L03'], columns=['R01', 'R02', 'R10'],
+	)
+	render_heatmap(tmp_path / 'single.png', table, dpi=50)
+	render_heatmap(tmp_path / 'facets.png', dict(Amp1=table, Amp2=table.iloc[:1]), dpi=50)
+	for name in ['single', 'facets']:
+		assert read_png(tmp_path / f'{name}.png').shape[:2] == (240, 320)
+	
+	render_heatmap(tmp_path / 'empty.png', pd.DataFrame([[np.nan, 3]], index=['L01'], columns=['R01', 'R02']))
+	assert (tmp_path / 'empty.png').read_bytes() == EMPTY_PNG
+	assert read_png(tmp_path / 'empty.png').shape[:2] == (1, 1)
@@ -0,0 +1,40 @@
+import gzip
+
+from bartseq.index import ReadIndexer, ReadIndex, iter_fq_block, barcode_matches
+from bartseq.io import BlockWriter
+from bartseq.read_tagger import TaggedRead
+
+
+def make_read(i: int, barcode: str) -> TaggedRead:
+	return TaggedRead(f'@r{i}', 'I' * 12, 1, None, barcode, 'LL', 'ACGTACGTAC', frozenset(), False)
+
+
+def test_barcode_matches():
+	assert barcode_matches('L01', ['R03', 'L01'])
+	assert barcode_matches('R03,L01', ['L01', 'R03'])
+	assert not barcode_matches('L01,R04', ['L01', 'R03'])
+
+
+def test_indexed_blocks(tmp_path):
+	paths = [tmp_path / f'r{r}.fastq.gz' for r in [1, 2]]
+	path_index = tmp_path / 'index.json'
+	
+	with BlockWriter(paths[0], 'gz') as w1, BlockWriter(paths[1], 'gz') as w2:
+		indexer = ReadIndexer([w1, w2], path_index, 3)
+		for i in range(10):
+			indexer.write(make_read(i, f'L0{i % 4}'), make_read(i, 'R01'))
+		indexer.close()
+	
+	# Still a valid gzip file with all records
+	with gzip.open(paths[0], 'rt') as f:
+		assert f.read().count('@r') == 10
+	
+	index = ReadIndex.load(path_index)
+	assert [b.start for b in index.blocks] == [0, 3, 6, 9]
+	assert index.select_barcode('L03,R01') == {1, 2}
+	assert index.select_range(4, 7) == {1, 2}
+	
+	block = index.blocks[2]
+	headers = [header for header, _, _ in iter_fq_block(paths[1], block.offsets[1], block.n_records)]
+	assert [h.split()[0] for h in headers] == ['@r6', '@r7', '@r8']
+
@@ -0,0 +1,15 @@
+import pytest
+
+from bartseq.io import BlockWriter, transparent_open, iter_fq
+
+
+@pytest.mark.parametrize('compression', ['zst', 'lz4'])
+def test_fast_compressions(tmp_path, compression):
+	pytest.importorskip(dict(zst='zstandard', lz4='lz4.frame')[compression])
+	path = tmp_path / f'r.fastq.{compression}'
+	with BlockWriter(path, compression, level=1) as w:
+		for i in range(4):
+			w.write(f'@r{i} 1\nACGT\n+\nIIII\n')
+			w.flush_block()
+	with transparent_open(path) as f:
+		assert [header.split()[0] for header, _, _ in iter_fq(f)] == ['@r0', '@r1', '@r2', '@r3']
@@ -0,0 +1,28 @@
+import gzip
+import os
+
+from bartseq.manifest import load_manifest, MANIFEST_PATH
+
+
+def test_manifest(tmp_path):
+	(tmp_path / 'in' / 'reads').mkdir(parents=True)
+	(tmp_path / 'in' / 'amplicons.fa').write_text('>A1\nACGT\n>A2\nGGCC\n')
+	(tmp_path / 'in' / 'barcodes.fa').write_text('>L01\nACGTACGT\n>R01\nACGTACGTAA\n')
+	for lib in ['Lib1', 'Lib2']:
+		for r in [1, 2]:
+			(tmp_path / 'in' / 'reads' / f'{lib}_R{r}_001.fastq.gz').write_bytes(gzip.compress(b''))
+	
+	manifest = load_manifest(tmp_path)
+	assert manifest.libraries == ['Lib1', 'Lib2']
+	assert manifest.amplicons == dict(Lib1=['A1', 'A2'], Lib2=['A1', 'A2'])
+	assert manifest.len_barcode == 10
+	assert (tmp_path / MANIFEST_PATH).is_file()
+	
+	# Cached, so changes that don’t touch the inputs aren’t noticed
+	(tmp_path / MANIFEST_PATH).write_text((tmp_path / MANIFEST_PATH).read_text().replace('"A2"', '"cached"'))
+	assert load_manifest(tmp_path).amplicons['Lib1'] == ['A1', 'cached']
+	
+	path_amplicons = tmp_path / 'in' / 'amplicons.fa'
+	path_amplicons.write_text('>A1\nACGT\n>A3\nGGCC\n')
+	os.utime(path_amplicons, ns=(0, 0))  # Make sure the modification time differs even on coarse file systems
+	assert load_manifest(tmp_path).amplicons['Lib1'] == ['A1', 'A3']
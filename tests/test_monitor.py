@@ -0,0 +1,41 @@
+import json
+from types import SimpleNamespace
+
+from pytest import raises
+
+from bartseq.read_tagger.monitor import AbortRule, StatsMonitor, TaggingAborted, partial_stats_path
+
+
+def test_parse_abort_rule():
+	assert AbortRule.parse('n_regular<0.2@5000000') == AbortRule(None, 'n_regular', '<', .2, 5000000)
+	assert AbortRule.parse('read2.n_junk > 0.5') == AbortRule('read2', 'n_junk', '>', .5, 0)
+	with raises(ValueError):
+		AbortRule.parse('n_regular=0.2')
+
+
+def test_monitor(tmp_path):
+	path = partial_stats_path(tmp_path / 'Lib1_stats.json')
+	assert path.name == 'Lib1_stats.partial.json'
+	
+	tagger = SimpleNamespace(stats=dict(n_regular=0))
+	abort_rules = [AbortRule.parse('n_regular<0.5@20')]
+	monitor = StatsMonitor(path, [tagger], interval=1e-9, abort_rules=abort_rules, check_every=10)
+	
+	tagger.stats['n_regular'] = 9
+	monitor.update(10)
+	assert json.loads(path.read_text())['rates']['read1']['n_regular'] == .9
+	
+	tagger.stats['n_regular'] = 9
+	with raises(TaggingAborted):
+		monitor.update(20)
+	assert json.loads(path.read_text())['aborted'] == 'n_regular<0.5@20'
+
+
+def test_monitor_removes_stale_snapshot(tmp_path):
+	path = partial_stats_path(tmp_path / 'Lib1_stats.json')
+	path.write_text(json.dumps(dict(n_reads=10, aborted='n_regular<0.5@10')))  # From an earlier, aborted run
+	monitor = StatsMonitor(path, [SimpleNamespace(stats={})], interval=0)
+	monitor.update(1000)
+	monitor.close()
+	assert not path.exists()
+	monitor.close()  # Nothing to remove
@@ -1,6 +1,11 @@
-from pytest import warns
+import json
+import random
+import warnings
 
-from bartseq.read_tagger import get_mismatches, ReadTagger, TaggedRead
+from pytest import warns, raises
+
+from bartseq.read_tagger import get_mismatches, ReadTagger, TaggedRead, get_all_barcodes, hamming_distances
+from bartseq.read_tagger.matchers import Matcher, AhoCorasickMatcher, KmerMatcher
 
 
 def test_get_mismatches_1():
@@ -51,6 +56,35 @@ def test_tagger_ambiguous_barcodes():
 		ReadTagger(dict(ab='A', ac='B'), 1, 1)
 
 
+def test_hamming_distances():
+	assert hamming_distances(['AAAA', 'AAAT', 'TTTT']).tolist() == [
+		[0, 1, 4],
+		[1, 0, 3],
+		[4, 3, 0],
+	]
+
+
+def test_ambiguous_warnings_capped():
+	barcodes = ['AAAAAAAA', 'AAAAAAAT', 'AAAAAATT', 'CCCCCCCC']
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter('always')
+		found, blacklist = get_all_barcodes(barcodes, max_mm=1, max_warnings=2)
+	assert len(caught) == 3
+	assert 'more ambiguous modifications' in str(caught[-1].message)
+	assert 'CCCCCCCC' in found.values()
+	assert {'AAAAAAAA', 'AAAAAAAT', 'AAAAAAAC', 'AAAAAAAG'} <= set(blacklist)
+	assert not set(found) & set(blacklist)
+
+
+def test_conflict_table():
+	with warns(UserWarning):
+		tagger = ReadTagger(dict(ab='A', ac='B', xy='C'), 1, 1)
+	table = tagger.get_conflict_table()
+	assert table.to_dict('records') == [
+		dict(id_1='A', barcode_1='ab', id_2='B', barcode_2='ac', distance=1, patterns='aA,aC,aG,aT'),
+	]
+
+
 def test_tag_read_find1():
 	tagger = ReadTagger(dict(ab='A'), 1, 1)
 	
@@ -99,3 +133,75 @@ def test_tag_read_find2():
 		n_junk=1,
 		n_regular=1,
 	)
+
+
+def test_tag_read_cached():
+	tagger = ReadTagger(dict(ab='A'), 1, 1, cache_size=2)
+	uncached = ReadTagger(dict(ab='A'), 1, 1)
+	
+	for i, seq in enumerate(['XXabLblah', 'XXabLblah', 'XXbvblahL', 'XXaGLblah', 'XXabLblah']):
+		assert tagger.tag_read(str(i), seq, qual_9) == uncached.tag_read(str(i), seq, qual_9)
+	
+	# stats are still counted per read
+	assert tagger.stats == uncached.stats
+	# the first read got evicted by the other two
+	assert tagger.cache_stats == dict(n_hits=1, n_misses=4)
+	assert list(tagger.cache) == ['XXaGLblah', 'XXabLblah']
+
+
+def test_search_window():
+	tagger = ReadTagger(dict(ab='A', cd='C'), 1, 1, search_window=1., search_margin=0)
+	tagger.window.n_warmup = 2
+	tagger.find_barcode('XabLblah')
+	tagger.find_barcode('XXabLblah')
+	assert tagger.window.end == 4
+	
+	assert tagger.find_barcode('XabLcdah') == (1, 3, 'ab', frozenset({'C'}))  # cd is after the window
+	assert tagger.find_barcode('XXXXXabLblah')[:3] == (5, 7, 'ab')  # fallback
+	assert tagger.window.get_stats()['n_fallback'] == 1
+	assert tagger.window.get_stats()['offsets'] == {1: 2, 2: 1, 5: 1}
+	
+	# Same results as without window, also for barcodes overlapping its end
+	no_window = ReadTagger(dict(ab='A', cd='C'), 1, 1)
+	rng = random.Random(0)
+	for _ in range(200):
+		read = ''.join(rng.choice('abcdX') for _ in range(12))
+		assert tagger.find_barcode(read) == no_window.find_barcode(read)
+
+
+def test_search_window_cached():
+	tagger = ReadTagger(dict(ab='A'), 1, 1, search_window=1., cache_size=2)
+	for _ in range(3):
+		tagger.tag_read('a', 'XXabLblah', qual_9)
+	assert tagger.cache_stats == dict(n_hits=2, n_misses=1)
+	# Every read counts, not only distinct ones
+	assert tagger.window.get_stats()['offsets'] == {2: 3}
+
+
+def test_matchers_agree():
+	rng = random.Random(0)
+	patterns = {''.join(rng.choice('ACGT') for _ in range(rng.choice([3, 4, 6]))): f'bc{i}' for i in range(30)}
+	aho, kmer = AhoCorasickMatcher(patterns), KmerMatcher(patterns)
+	for _ in range(200):
+		read = ''.join(rng.choice('ACGT') for _ in range(40))
+		for end in [None, 10, 50]:
+			assert list(kmer.iter(read, end)) == list(aho.iter(read, end))
+	with raises(TypeError):  # abstract
+		Matcher(patterns)
+
+
+def test_run_counts_all_reads(tmp_path):
+	from bartseq.read_tagger.main import run
+	
+	paths_in = [tmp_path / f'r{r}.fastq' for r in [1, 2]]
+	for r, path in enumerate(paths_in, 1):
+		path.write_text(''.join(f'@r{i} {r}\nACGTACGTACGT\n+\nIIIIIIIIIIII\n' for i in range(5)))
+	(tmp_path / 'barcodes.fa').write_text('>L01\nAAAACCCC\n>R01\nGGGGTTTT\n')
+	
+	for in_2 in [paths_in[1], None]:
+		stats_file = tmp_path / 'stats.json'
+		run(
+			str(paths_in[0]), str(tmp_path / 'o1.fastq'), in_2=in_2 and str(in_2), out_2=str(tmp_path / 'o2.fastq'),
+			bc_file=str(tmp_path / 'barcodes.fa'), stats_file=str(stats_file), total=0, log_init=False,
+		)
+		assert json.loads(stats_file.read_text())['n_reads'] == 5
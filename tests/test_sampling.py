@@ -0,0 +1,41 @@
+import io
+
+from bartseq.io import FastqSkipper
+from bartseq.read_tagger.sampling import Sampler, wilson_interval
+
+
+def make_fastq(n: int, r: int = 1) -> bytes:
+	return ''.join(f'@r{i} {r}\n{"ACGT" * (i % 5 + 1)}\n+\n{"I" * 4 * (i % 5 + 1)}\n' for i in range(n)).encode()
+
+
+def test_skipper():
+	skipper = FastqSkipper(io.BytesIO(make_fastq(100)), chunk_size=7)
+	assert skipper.skip(3) == 3
+	assert skipper.read() == ('@r3 1', 'ACGTACGTACGTACGT', 'IIIIIIIIIIIIIIII')
+	assert skipper.skip(50) == 50
+	assert skipper.read()[0] == '@r54 1'
+	assert skipper.skip(50) == 45
+	assert skipper.read() is None
+
+
+def test_sampler_pairs():
+	def sampler(sample):
+		readers = [FastqSkipper(io.BytesIO(make_fastq(1000, r)), chunk_size=100) for r in [1, 2]]
+		return Sampler(readers, sample, seed=42)
+	
+	for sample in [.1, 50]:
+		s = sampler(sample)
+		pairs = list(s)
+		assert s.n_scanned == 1000
+		assert all(r1[0].split()[0] == r2[0].split()[0] for r1, r2 in pairs)
+		assert len({r1[0] for r1, _ in pairs}) == len(pairs)
+		assert pairs == list(sampler(sample))  # seeded
+	assert len(list(sampler(50))) == 50
+	assert 50 < len(list(sampler(.1))) < 150
+	assert len(list(sampler(2000))) == 1000
+
+
+def test_wilson_interval():
+	low, high = wilson_interval(50, 100)
+	assert 0.4 < low < 0.5 < high < 0.6
+	assert wilson_interval(0, 10)[0] == 0.
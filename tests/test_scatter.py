@@ -0,0 +1,75 @@
+import gzip
+import json
+from collections import Counter
+
+from bartseq.counter.main import print_counter
+from bartseq.io import transparent_open, iter_fq
+from bartseq.scatter import split_fastq, merge_stats, merge_stats_files, merge_counts, format_summary
+from bartseq.xlsx_export.main import RE_SUMMARY
+
+
+def test_split_fastq(tmp_path):
+	for read in [1, 2]:
+		with gzip.open(tmp_path / f'R{read}.fastq.gz', 'wt') as f:
+			for i in range(10):
+				f.write(f'@r{i}/{read}\nACGT\n+\nIIII\n')
+	ins = [tmp_path / f'R{read}.fastq.gz' for read in [1, 2]]
+	pattern = str(tmp_path / 'shards' / 'Lib1.part{shard}_R{read}.fastq.gz')
+	
+	assert split_fastq(ins, pattern, 3, chunk_size=2) == [4, 4, 2]
+	for read in [1, 2]:
+		with transparent_open(pattern.format(shard=1, read=read)) as f:
+			assert [header for header, _, _ in iter_fq(f)] == [f'@r{i}/{read}' for i in [2, 3, 8, 9]]
+
+
+def test_merge_stats(tmp_path):
+	shards = [
+		dict(n_reads=10, n_both_regular=4, read1=dict(n_regular=5, n_junk=5), read2=dict(n_regular=6)),
+		dict(n_reads=5, n_both_regular=1, read1=dict(n_regular=2, n_junk=3), read2=dict(n_regular=1, n_junk=4)),
+	]
+	paths = []
+	for i, shard in enumerate(shards):
+		paths.append(tmp_path / f'Lib1.part{i}_stats.json')
+		paths[-1].write_text(json.dumps(shard))
+	merge_stats_files(paths, tmp_path / 'Lib1_stats.json')
+	
+	merged = json.loads((tmp_path / 'Lib1_stats.json').read_text())
+	assert merged['n_reads'] == 15
+	assert merged['n_both_regular'] == 5
+	assert merged['read1'] == dict(n_regular=7, n_junk=8)
+	assert merged['read2'] == dict(n_regular=7, n_junk=4)
+
+
+def test_merge_window_stats():
+	def window(end, offsets):
+		return dict(
+			quantile=.999, margin=5, n_warmup=2, end=end, n_in_window=4, n_fallback=1, n_fallback_found=0,
+			fallback_rate=.2, offsets=offsets,
+		)
+	
+	shards = [
+		dict(n_reads=5, read1=dict(n_regular=5), search_window=dict(read1=window(20, {'3': 2, '10': 1}))),
+		dict(n_reads=5, read1=dict(n_regular=5), search_window=dict(read1=window(None, {'3': 1}))),
+	]
+	*_, extra = merge_stats(shards)
+	merged = extra['search_window']['read1']
+	assert merged['ends'] == [20, None]  # No made-up common window
+	assert 'end' not in merged
+	assert merged['offsets'] == {'3': 3, '10': 1}
+	assert merged['fallback_rate'] == .2
+
+
+def test_merge_counts(tmp_path):
+	shards = [Counter({('L01', 'R01', 'ampA'): 3}), Counter({('L01', 'R01', 'ampA'): 2, ('L02', 'R01', 'ampB'): 1})]
+	paths = []
+	for i, counts in enumerate(shards):
+		paths.append(tmp_path / f'Lib1.part{i}.tsv')
+		with paths[-1].open('w') as f:
+			print_counter(counts, f)
+	assert merge_counts(paths) == shards[0] + shards[1]
+
+
+def test_format_summary():
+	match = RE_SUMMARY.match(format_summary(10, 2, 7, 1))
+	assert match
+	assert [int(match[stat]) for stat in ['total', 'zero', 'one', 'more']] == [10, 2, 7, 1]
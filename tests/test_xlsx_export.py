@@ -0,0 +1,54 @@
+import pytest
+
+from bartseq.counter.store import CountStore, STORE_PATH
+from bartseq.xlsx_export.main import main
+
+SUMMARY = '''HISAT2 summary stats:
+	Total reads: {total}
+		Aligned 0 time: 1 (10.00%)
+		Aligned 1 time: {one} (80.00%)
+		Aligned >1 times: 1 (10.00%)
+	Overall alignment rate: 90.00%
+'''
+
+
+@pytest.mark.parametrize('from_store', [False, True])
+def test_export_xlsx(tmp_path, from_store):
+	openpyxl = pytest.importorskip('openpyxl')
+	dir_counts = tmp_path / 'process' / '5-counts' / 'both'
+	dir_mapped = tmp_path / 'process' / '4-mapped'
+	dir_counts.mkdir(parents=True)
+	dir_mapped.mkdir(parents=True)
+	(dir_counts / 'Lib1.tsv').write_text(
+		'bc_l\tbc_r\tamp\tcount\nL01\tR01\tampA\t3\nL01\tR01\tampB\t2\nL02\tR01\tampA\t1\nL01\t-\tampA\t9\n'
+	)
+	(dir_counts / 'Lib2.tsv').write_text('bc_l\tbc_r\tamp\tcount\nL03\tR02\tampB\t5\n')
+	# Neither a running count job’s snapshot nor a shard counted on its own are libraries
+	for name in ['Lib2.partial', 'Lib1.part0']:
+		(dir_counts / f'{name}.tsv').write_text('bc_l\tbc_r\tamp\tcount\nL04\tR04\tampA\t7\n')
+	for lib, total in [('Lib1', 10), ('Lib2', 20)]:
+		for read in [1, 2]:
+			(dir_mapped / f'{lib}_R{read}_summary.txt').write_text(SUMMARY.format(total=total + read, one=total + read - 2))
+	
+	if from_store:  # Lib2 is counted after the store was last synced
+		with CountStore(tmp_path / STORE_PATH) as store:
+			store.sync({'Lib1': dir_counts / 'Lib1.tsv'}, 'both')
+	
+	main(tmp_path, 'both', tmp_path / 'both.xlsx')
+	
+	wb = openpyxl.load_workbook(tmp_path / 'both.xlsx', read_only=True)
+	assert wb.sheetnames == ['Statistics', 'Lib1', 'Lib2']
+	assert [list(row) for row in wb['Statistics'].values] == [
+		['library', 'read', 'total', 'zero', 'one', 'more'],
+		['Lib1', 1, 11, 1, 9, 1],
+		['Lib1', 2, 12, 1, 10, 1],
+		['Lib2', 1, 21, 1, 19, 1],
+		['Lib2', 2, 22, 1, 20, 1],
+	]
+	# Only entries with both barcodes, missing amplicons are 0
+	assert [list(row) for row in wb['Lib1'].values] == [
+		['bc_l', 'bc_r', 'ampA', 'ampB'],
+		['L01', 'R01', 3, 2],
+		['L02', 'R01', 1, 0],
+	]
+	assert [list(row) for row in wb['Lib2'].values] == [['bc_l', 'bc_r', 'ampB'], ['L03', 'R02', 5]]